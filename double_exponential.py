@@ -1,9 +1,1256 @@
-# Copyright (c) 2021, 2022, emece67 - MIT License
+﻿# Copyright (c) 2021, 2022, emece67 - MIT License
 #!/usr/bin/env python3
 
+import ast
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import mmap
 import mpmath as mp
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 
-def double_exponential(f, a, b):
+try:
+  import numpy as np
+except ImportError:           # numpy is only needed by the numpy backend
+  np = None
+
+try:
+  import gmpy2
+except ImportError:           # gmpy2 is only needed by the gmpy2 arithmetic
+  gmpy2 = None
+
+try:
+  import flint
+except ImportError:           # python-flint is only needed by the flint arithmetic
+  flint = None
+
+
+# version of the format of node cache files, to be increased whenever
+# the format, the transform or the truncation of the nodes change
+NODE_FILE_VERSION = 2
+
+# directory where node tables are cached on disk (None if disabled)
+_node_cache_dir = os.environ.get('DOUBLE_EXPONENTIAL_NODE_CACHE')
+
+_NODE_FILE_MAGIC = b'DENODES\0'
+_NODE_FILE_HEADER = struct.Struct('<8sIIIIII')  # magic, version, variant, prec, level, mantissa bytes, nodes
+_NODE_FILE_RECORD = struct.Struct('<Bqq')       # sign, exponent, bit count; followed by the mantissa
+
+# relative difference (in units of mp.eps) allowed between the values of
+# an integrand at symmetric abscissas to take it as even or odd
+_PARITY_TOL = 4
+
+# largest ratio trusted between the correct digits of the approximations
+# at consecutive levels (ideally 2, as the digits double at each level,
+# but somewhat less in practice), and smallest one taken as such doubling
+_DIGITS_GROWTH = 1.75
+_DIGITS_DOUBLING = 1.5
+
+# header of the messages of the server, the length of the JSON that follows
+_MESSAGE_HEADER = struct.Struct('>I')
+
+# arithmetics that can build the nodes, and the one in use
+ARITHMETICS = ('auto', 'mpmath', 'gmpy2', 'flint')
+_arithmetic = os.environ.get('DOUBLE_EXPONENTIAL_ARITHMETIC', 'auto')
+
+
+def set_node_cache(path):
+  """
+  Sets the directory `path` where the abscissas and weights computed by
+    `double_exponential()` are cached on disk, so they are computed only
+    once for all processes, or disables such cache if `path` is None.
+    By default, the directory given by the environment variable
+    DOUBLE_EXPONENTIAL_NODE_CACHE is used, if any.
+
+  Each file holds the nodes of a level, for a given variant, precision
+    and truncation (only those at the right of the centre point for the
+    variants symmetric about it, tanh-sinh and sinh-sinh). The first
+    time a process needs them, they are loaded from the file instead of
+    computed, and each process keeps its own decoded copy in memory (in
+    the LRU cache of `_nodes()`). As the truncation is part of the
+    file name and header, files are not used when the truncation
+    changes (e.g. because the precision does). Files are also
+    versioned, so they are not used when their format or the transform
+    change.
+  """
+
+  global _node_cache_dir
+  _node_cache_dir = path
+  _nodes.cache_clear()
+
+
+def set_arithmetic(name):
+  """
+  Sets the arithmetic used to build the abscissas and weights used by
+    `double_exponential()`, which, at high precision, is much faster
+    with the MPFR numbers of gmpy2 ('gmpy2') or the arb balls of
+    python-flint ('flint', using their midpoints) than with mpmath
+    ('mpmath'). With 'auto' (the default, unless the environment
+    variable DOUBLE_EXPONENTIAL_ARITHMETIC gives another) gmpy2 or
+    flint are used if installed, flint first from 2000 bits on, where
+    it is the fastest. Otherwise mpmath is used.
+
+  The nodes are converted to mpmath numbers in any case, so only the
+    time needed to build them depends on this choice (but for the last
+    bits: gmpy2 almost always gives the same nodes as mpmath, while
+    flint seldom does).
+  """
+
+  global _arithmetic
+  if name not in ARITHMETICS:
+    raise ValueError("unknown arithmetic '%s'" % name)
+  if name == 'gmpy2' and gmpy2 is None:
+    raise ImportError('the gmpy2 arithmetic needs gmpy2 to be installed')
+  if name == 'flint' and flint is None:
+    raise ImportError('the flint arithmetic needs python-flint to be installed')
+  _arithmetic = name
+  _nodes.cache_clear()
+
+
+def _node_column(buf, offset, n, width):
+  """
+  Returns a tuple with the `n` mpf values stored from `offset` on in
+    `buf`, the contents of a node cache file, with mantissas of `width`
+    bytes.
+  """
+
+  size = _NODE_FILE_RECORD.size + width
+  column = []
+  for offset in range(offset, offset + n * size, size):
+    sign, exp, bc = _NODE_FILE_RECORD.unpack_from(buf, offset)
+    offset += _NODE_FILE_RECORD.size
+    man = int.from_bytes(buf[offset:offset + width], 'little')
+    column.append(mp.mp.make_mpf((sign, mp.libmp.MPZ(man), exp, bc)))
+  return tuple(column)
+
+
+def _node_file(variant, prec, level, exptmax):
+  """
+  Returns the path of the node cache file for the given arguments (see
+    `_nodes()`) and the key identifying its contents.
+  """
+
+  sign, man, exp, bc = exptmax._mpf_
+  key = 'v%i %i %i %i %i %x %i %i' % (NODE_FILE_VERSION, variant, prec, level, sign, man, exp, bc)
+  name = 'nodes-%s.bin' % hashlib.sha1(key.encode()).hexdigest()[:20]
+  return os.path.join(_node_cache_dir, name), key.encode()
+
+
+def _load_nodes(variant, prec, level, exptmax):
+  """
+  Returns the nodes (see `_nodes()`) stored in their cache file, or None
+    if there is no such file or it does not hold them. The file is
+    memory-mapped only while its nodes are decoded.
+  """
+
+  path, key = _node_file(variant, prec, level, exptmax)
+  try:
+    with open(path, 'rb') as file:
+      buf = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+  except (OSError, ValueError):
+    return None
+  try:
+    magic, version, v, p, l, width, n = _NODE_FILE_HEADER.unpack_from(buf, 0)
+    offset = _NODE_FILE_HEADER.size
+    if (magic, version, v, p, l) != (_NODE_FILE_MAGIC, NODE_FILE_VERSION, variant, prec, level) \
+        or buf[offset:offset + len(key)] != key:
+      raise ValueError('stale node cache file')
+    offset += len(key)
+    size = n * (_NODE_FILE_RECORD.size + width)
+    columns = 4 if variant == 1 else 2
+    if len(buf) != offset + columns * size:
+      raise ValueError('truncated node cache file')
+    nodes = tuple(_node_column(buf, offset + k * size, n, width) for k in range(columns))
+    if variant == 1:
+      return nodes
+    # symmetric variants: only the nodes at the right are stored
+    xpl, wpl = nodes
+    return xpl, tuple(-x for x in xpl), wpl, wpl
+  except (struct.error, ValueError):
+    return None
+  finally:
+    buf.close()
+
+
+def _store_nodes(variant, prec, level, exptmax, nodes):
+  """
+  Stores `nodes` (see `_nodes()`) in their cache file, if possible. For
+    the variants symmetric about the centre point, whose nodes at the
+    left just mirror those at the right, only the latter are stored.
+  """
+
+  path, key = _node_file(variant, prec, level, exptmax)
+  if variant != 1:
+    nodes = (nodes[0], nodes[2])
+  n = len(nodes[0])
+  width = (max(abs(v._mpf_[1]).bit_length() for column in nodes for v in column) + 7) // 8
+  data = [_NODE_FILE_HEADER.pack(_NODE_FILE_MAGIC, NODE_FILE_VERSION, variant, prec, level, width, n), key]
+  for column in nodes:
+    for v in column:
+      sign, man, exp, bc = v._mpf_
+      data.append(_NODE_FILE_RECORD.pack(sign, exp, bc))
+      data.append(int(man).to_bytes(width, 'little'))
+  file = None
+  try:
+    os.makedirs(_node_cache_dir, exist_ok = True)
+    with tempfile.NamedTemporaryFile(dir = _node_cache_dir, delete = False) as file:
+      file.write(b''.join(data))
+    os.replace(file.name, path)
+  except OSError:
+    # do not leave the temporary file behind
+    if file is not None:
+      try:
+        os.unlink(file.name)
+      except OSError:
+        pass
+
+
+@lru_cache(maxsize = 256)
+def _nodes(variant, prec, level, exptmax):
+  """
+  Computes the abscissas and weights used at level `level` by the
+    variant `variant` (tanh-sinh (0), exp-sinh (1) or sinh-sinh (2)) of
+    the double exponential method, working with `prec` bits and walking
+    abscissas until exp(t) exceeds `exptmax`.
+  Returns a tuple with:
+    * the normalized abscissas at the right of the centre point;
+    * the normalized abscissas at the left of the centre point;
+    * the weights, times cosh(t), for the abscissas at the right;
+    * the weights, times cosh(t), for the abscissas at the left.
+
+  Results are cached (LRU), so the cost of building the nodes is paid
+    once per precision instead of once per integral. They are also
+    cached on disk if a directory was set with `set_node_cache()`.
+  """
+
+  if _node_cache_dir is not None:
+    nodes = _load_nodes(variant, prec, level, exptmax)
+    if nodes is not None:
+      return nodes
+    nodes = _make_nodes(variant, prec, level, exptmax)
+    _store_nodes(variant, prec, level, exptmax, nodes)
+    return nodes
+  return _make_nodes(variant, prec, level, exptmax)
+
+
+def _make_nodes(variant, prec, level, exptmax):
+  """
+  Does the work of `_nodes()`, with the arithmetic set by
+    `set_arithmetic()`.
+  """
+
+  arithmetics = (_arithmetic,)
+  if _arithmetic == 'auto':
+    # flint is the fastest at high precision, gmpy2 agrees with mpmath
+    arithmetics = ('flint', 'gmpy2') if prec >= 2000 else ('gmpy2', 'flint')
+  for arithmetic in arithmetics:
+    if arithmetic == 'gmpy2' and gmpy2 is not None:
+      return _make_nodes_gmpy2(variant, prec, level, exptmax)
+    if arithmetic == 'flint' and flint is not None:
+      return _make_nodes_flint(variant, prec, level, exptmax)
+  return _make_nodes_mpmath(variant, prec, level, exptmax)
+
+
+def _make_nodes_mpmath(variant, prec, level, exptmax):
+  """
+  Does the work of `_nodes()` in mpmath arithmetic.
+  """
+
+  with mp.workprec(prec):
+    pi4 = mp.pi() / 4
+    h = mp.ldexp(1, -level)   # rectangle width
+    expt = mp.exp(h)          # exp(t)
+    exph = expt ** 2 if level else expt
+    xpl, xmi, wpl, wmi = [], [], [], []
+    while True:
+      # try to avoid the computation of too many exp functions...
+      iexpt = 1 / expt
+      cht = (expt + iexpt) / 2
+      # pi / 2 * sinh(t)
+      pi2sh = pi4 * (expt - iexpt)
+      # weight and abscissa
+      w = r = mp.exp(pi2sh)
+      if variant != 1:
+        iexppi2sh = 1 / r
+        w += iexppi2sh        # 2cosh(pi2sh)
+        r -= iexppi2sh        # 2sinh(pi2sh)
+        r /= w if not variant else 2
+        w /= 2                # cosh(pi2sh)
+      if not variant:
+        w = 1 / w ** 2
+      xpl.append(r)
+      xmi.append(1 / r if variant == 1 else -r)
+      wpl.append(w * cht)
+      wmi.append(cht / w if variant == 1 else w * cht)
+      # next exp(t)
+      expt *= exph
+      # done with level?
+      if expt > exptmax:
+        break
+  return tuple(xpl), tuple(xmi), tuple(wpl), tuple(wmi)
+
+
+def _make_nodes_gmpy2(variant, prec, level, exptmax):
+  """
+  Does the work of `_nodes()` in gmpy2 (MPFR) arithmetic, with the same
+    operations as `_make_nodes_mpmath()`.
+  """
+
+  with gmpy2.context(precision = prec):
+    pi4 = gmpy2.const_pi() / 4
+    h = gmpy2.mul_2exp(gmpy2.mpfr(1), -level)   # rectangle width
+    expt = gmpy2.exp(h)       # exp(t)
+    exph = expt ** 2 if level else expt
+    sign, man, exp, bc = exptmax._mpf_
+    exptmax = gmpy2.mul_2exp(gmpy2.mpfr(-int(man) if sign else int(man)), int(exp))
+    xpl, xmi, wpl, wmi = [], [], [], []
+    while True:
+      iexpt = 1 / expt
+      cht = (expt + iexpt) / 2
+      pi2sh = pi4 * (expt - iexpt)
+      w = r = gmpy2.exp(pi2sh)
+      if variant != 1:
+        iexppi2sh = 1 / r
+        w += iexppi2sh
+        r -= iexppi2sh
+        r /= w if not variant else 2
+        w /= 2
+      if not variant:
+        w = 1 / w ** 2
+      xpl.append(r)
+      xmi.append(1 / r if variant == 1 else -r)
+      wpl.append(w * cht)
+      wmi.append(cht / w if variant == 1 else w * cht)
+      expt *= exph
+      if expt > exptmax:
+        break
+
+  def mpf(v):
+    man, exp = v.as_mantissa_exp()
+    return mp.mp.make_mpf(mp.libmp.from_man_exp(int(man), int(exp)))
+  return tuple(tuple(mpf(v) for v in column) for column in (xpl, xmi, wpl, wmi))
+
+
+def _make_nodes_flint(variant, prec, level, exptmax):
+  """
+  Does the work of `_nodes()` in python-flint (arb) arithmetic, with the
+    same operations as `_make_nodes_mpmath()`, taking the midpoints of
+    the resulting balls.
+  """
+
+  saved = flint.ctx.prec
+  flint.ctx.prec = prec
+  try:
+    pi4 = flint.arb.pi() / 4
+    h = flint.arb(1) / (1 << level)   # rectangle width
+    expt = h.exp()            # exp(t)
+    exph = expt ** 2 if level else expt
+    xpl, xmi, wpl, wmi = [], [], [], []
+    while True:
+      iexpt = 1 / expt
+      cht = (expt + iexpt) / 2
+      pi2sh = pi4 * (expt - iexpt)
+      w = r = pi2sh.exp()
+      if variant != 1:
+        iexppi2sh = 1 / r
+        w += iexppi2sh
+        r -= iexppi2sh
+        r /= w if not variant else 2
+        w /= 2
+      if not variant:
+        w = 1 / w ** 2
+      xpl.append(r)
+      xmi.append(1 / r if variant == 1 else -r)
+      wpl.append(w * cht)
+      wmi.append(cht / w if variant == 1 else w * cht)
+      expt *= exph
+      if mp.mp.make_mpf(expt._mpf_) > exptmax:
+        break
+  finally:
+    flint.ctx.prec = saved
+  return tuple(tuple(mp.mp.make_mpf(v._mpf_) for v in column) for column in (xpl, xmi, wpl, wmi))
+
+
+def _classify(a, b):
+  """
+  Classifies the integral from `a` to `b` (neither being NaN and `a`
+    different from `b`) into one of the variants of the double
+    exponential method.
+  Returns a tuple with:
+    * the variant: tanh-sinh (0); exp-sinh (1); or sinh-sinh (2);
+    * the centre point of the transformed interval;
+    * the half length of the transformed interval (its sign for the
+      exp-sinh and sinh-sinh variants);
+    * True if limits in {(+/-inf, 0), (0, +/-inf), (+/-inf, -/+inf)};
+    * True if limits = (+/-inf, b), so the result must change sign.
+  """
+
+  tanhsinh = False            # True if tanh-sinh case
+  expsinh = False             # True if exp-sinh case
+  bpa2z = False               # True if limits in {(+/-inf, 0), (0, +/-inf), (+/-inf, -/+inf)}
+  chg = False                 # True if limits = (+/-inf, b)
+
+  if mp.isfinite(a) and mp.isfinite(b):
+    # tanh-sinh case
+    bpa2 = (b + a) / 2        # centre point
+    bma2 = (b - a) / 2        # half interval
+    tanhsinh = True
+  elif mp.isfinite(a) or mp.isfinite(b):
+    # exp-sinh case
+    chg = mp.isfinite(b)
+    bpa2, bma2 = (b, a) if chg else (a, b)
+    bma2 = mp.sign(bma2)
+    bpa2z = mp.almosteq(bpa2, 0.0)
+    expsinh = True
+  else:
+    # sinh-sinh case
+    bpa2 = 0
+    bma2 = mp.sign(b)
+    bpa2z = True
+
+  variant = 0 if tanhsinh else 1 if expsinh else 2
+  return (variant, bpa2, bma2, bpa2z, chg)
+
+
+@lru_cache(maxsize = 256)
+def _limits(variant, bpa2, bma2, bpa2z, prec, rtol = None):
+  """
+  Computes, for a precision of `prec` bits, the parameters controlling
+    the level and abscissa loops of an integral classified by
+    `_classify()`, aiming at a relative accuracy of `rtol` (by default,
+    that of the precision). Results are cached (LRU).
+  Returns a tuple with:
+    * the relative size below which the abscissa walk is stopped;
+    * the relative convergence threshold of the level loop;
+    * the maximum allowed level;
+    * the maximum value of exp(t) in the abscissa walk.
+  """
+
+  with mp.workprec(prec):
+    tanhsinh = variant == 0
+    pi2 = mp.pi() / 2
+
+    # digits aimed at
+    dps = _digits(rtol)
+    # convergence threshold
+    eps = mp.power(10, -dps)
+    thr = 10 * mp.sqrt(eps)
+    if bpa2z:
+      eps = mp.power(10, -(dps / 2) ** 2)
+    # maximum allowed level
+    levelmax = int(round(mp.log(dps, 2)) + 1)   # + 2) also acceptable
+    if rtol is not None:
+      # the error estimation lags one level behind
+      levelmax += 1
+
+    # maximum t (always for the working precision, as a shorter walk
+    # would miss much of an integrable singularity at the interval ends)
+    teps = mp.power(10, -mp.mp.dps)
+    if bpa2z:
+      teps = mp.power(10, -(mp.mp.dps / 2) ** 2)
+    if tanhsinh:
+      tmax = 2 * min(1, abs(bma2))
+    elif bpa2z:
+      tmax = mp.sqrt(teps)
+    else:
+      tmax = abs(1 / bpa2 / 2)
+    tmax = mp.ln(tmax / teps)
+    if not tanhsinh:
+      tmax *= 2
+##    tmax = mp.ln(tmax / pi2)
+    exptmax = tmax / pi2
+
+  return (eps, thr, levelmax, exptmax)
+
+
+def _digits(rtol):
+  """
+  Returns the number of decimal digits aimed at, for the working
+    precision and the relative accuracy `rtol` (None for that of the
+    precision).
+  """
+
+  dps = mp.mp.dps
+  if rtol is not None:
+    dps = max(1, min(dps, -mp.log10(rtol)))
+  return dps
+
+
+def _limits_numpy(variant, bpa2, bma2, bpa2z, rtol = None):
+  """
+  Same as `_limits()`, for the numpy backend, with the precision of
+    float64, also checking that it can be used.
+  Returns a tuple with the relative size below which the abscissa walk
+    is stopped, the relative convergence threshold of the level loop,
+    the maximum allowed level, the maximum value of exp(t) in the
+    abscissa walk and `bpa2` and `bma2`, as floats but for the maximum
+    level and exp(t).
+  """
+
+  if np is None:
+    raise ImportError('the numpy backend needs numpy to be installed')
+  if mp.mp.dps > 15:
+    raise ValueError('the numpy backend cannot work with mp.dps > 15')
+
+  eps, thr, levelmax, exptmax = _limits(variant, bpa2, bma2, bpa2z, mp.mp.prec, rtol)
+  return (float(eps), float(thr), levelmax, exptmax, float(bpa2), float(bma2))
+
+
+def _freeze(x):
+  """
+  Returns `x` (a number, or a tuple or list of them) with its mpf and mpc
+    values replaced by their raw representation, which, unlike them, is
+    not rounded to the current precision of the process unpickling it.
+  """
+
+  if isinstance(x, (tuple, list)):
+    return type(x)(_freeze(v) for v in x)
+  if isinstance(x, mp.matrix):
+    return ('_matrix_', x.rows, x.cols, [_freeze(v) for v in x.tolist()])
+  if isinstance(x, mp.mpf):
+    return ('_mpf_', x._mpf_)
+  if isinstance(x, mp.mpc):
+    return ('_mpc_', x._mpc_)
+  return x
+
+
+def _thaw(x):
+  """
+  Inverse of `_freeze()`, rounds to the current precision.
+  """
+
+  if isinstance(x, (tuple, list)):
+    if len(x) == 2 and x[0] == '_mpf_':
+      return mp.mpf(x[1])
+    if len(x) == 2 and x[0] == '_mpc_':
+      return mp.mpc(mp.mpf(x[1][0]), mp.mpf(x[1][1]))
+    if len(x) == 4 and x[0] == '_matrix_':
+      return mp.matrix(_thaw(x[3]))
+    return type(x)(_thaw(v) for v in x)
+  return x
+
+
+def _call(f, prec, x):
+  """
+  Returns `f(x)` computed with `prec` bits, or None if `f` raises an
+    ArithmeticError. Used to evaluate `f` thru an executor, so `x` and
+    the returned value are in the form given by `_freeze()`.
+  """
+
+  with mp.workprec(prec):
+    try:
+      return _freeze(f(_thaw(x)))
+    except ArithmeticError:
+      return None
+
+
+def _shape(v):
+  """
+  Returns the shape of the value `v` returned by an integrand, as a
+    tuple with its type (None for scalars, `tuple`, `list` or
+    `mp.matrix`) and its number of rows and columns.
+  """
+
+  if isinstance(v, (tuple, list)):
+    return (type(v), len(v), 1)
+  if isinstance(v, mp.matrix):
+    return (mp.matrix, v.rows, v.cols)
+  return (None, 1, 1)
+
+
+def _split(v, shape):
+  """
+  Returns a list with the components of the value `v` returned by an
+    integrand with shape `shape`. `v` is None if the integrand raised an
+    ArithmeticError, in such case all components are 0.
+  """
+
+  kind, rows, cols = shape
+  if v is None:
+    return [0] * (rows * cols)
+  if kind is None:
+    return [v]
+  if kind is mp.matrix:
+    return [v[i, j] for i in range(rows) for j in range(cols)]
+  return list(v)
+
+
+def _join(c, shape):
+  """
+  Inverse of `_split()`.
+  """
+
+  kind, rows, cols = shape
+  if kind is None:
+    return c[0]
+  if kind is mp.matrix:
+    return mp.matrix([c[i * cols:(i + 1) * cols] for i in range(rows)])
+  return kind(c)
+
+
+def _walk(f, bpa2, bma2, eps, nodes, shape, executor = None, chunk = 1, wsl = None, stats = None,
+          mirror = False, parity = None, start = None, ends = None):
+  """
+  Walks the abscissas in `nodes` (as returned by `_nodes()`) at both
+    sides of the centre point, adding the weighted values of `f`, whose
+    shape is `shape` (see `_shape()`). The walk of each side stops when
+    its contribution to the sum becomes negligible (relative size `eps`,
+    for all components), when that of both sides together does (while
+    both are walked) or when its nodes are exhausted.
+  The walk starts at the nodes `start` (a tuple with a position at the
+    right and one at the left, for resuming a walk) with the sum `wsl`
+    (a list), if given, and walks, at most, up to the nodes `ends`
+    (likewise), if given.
+  If a `stats` dict is given, the nanoseconds spent evaluating `f` and
+    the number of ArithmeticErrors raised are added to its 'f_ns' and
+    'errors' items.
+  If an `executor` is given, abscissas are sent to it in speculative
+    chunks, the first one with `chunk` nodes (at each side) and each of
+    the following ones half as large as the previous.
+  If `mirror`, `f` is taken as even about the centre point, so it is
+    only evaluated at the abscissas at its right, whose values are also
+    used for those at its left (only valid for the tanh-sinh and
+    sinh-sinh variants, whose nodes are symmetric).
+  If a `parity` dict is given, it is updated (see `_parity()`) with the
+    values of `f` at each pair of symmetric abscissas walked.
+  Returns a tuple with:
+    * a list with the weighted sum of each component;
+    * a tuple with the position reached at the right and at the left
+      (the number of nodes walked, when starting at the centre);
+    * a tuple with the number of function evaluations performed at the
+      right and at the left.
+  """
+
+  if executor is None and shape[0] is None and stats is None and parity is None:
+    # scalar integrand
+    xpl, xmi, wpl, wmi = nodes
+    right, left = start or (0, 0)
+    nr, nl = ends or (len(xpl), len(xmi))
+    wsl = wsl[0] if wsl else 0  # weigthed sum
+    nfe = [0, 0]
+    while right < nr or left < nl:
+      both = right < nr and left < nl
+      p = q = 0
+      if right < nr:
+        try:
+          fpl = f(bpa2 + bma2 * xpl[right])
+        except ArithmeticError:
+          fpl = 0
+        p = fpl * wpl[right] if mp.isnormal(fpl) else 0
+        right += 1
+        nfe[0] += 1
+      if left < nl:
+        if mirror:
+          q = p
+        else:
+          try:
+            fmi = f(bpa2 + bma2 * xmi[left])
+          except ArithmeticError:
+            fmi = 0
+          q = fmi * wmi[left] if mp.isnormal(fmi) else 0
+          nfe[1] += 1
+        left += 1
+      wsl += p + q
+      # early tests (mainly for the sinh-sinh case), for both sides
+      # together and for each one on its own
+      if both and abs(p + q) <= abs(eps * wsl):
+        break
+      if abs(p) <= abs(eps * wsl):
+        nr = min(nr, right)
+      if abs(q) <= abs(eps * wsl):
+        nl = min(nl, left)
+    return ([wsl], (right, left), tuple(nfe))
+
+  if executor is None:
+    def values(x):
+      try:
+        return f(x)
+      except ArithmeticError:
+        return None
+    evaluate = lambda xs: [values(x) for x in xs]
+  else:
+    call = partial(_call, f, mp.mp.prec)
+    evaluate = lambda xs: _thaw(list(executor.map(call, _freeze(xs))))
+  if stats is not None:
+    plain = evaluate
+    def evaluate(xs):
+      start = time.perf_counter_ns()
+      fx = plain(xs)
+      stats['f_ns'] += time.perf_counter_ns() - start
+      stats['errors'] += sum(v is None for v in fx)
+      return fx
+  steps = _steps(bpa2, bma2, eps, nodes, shape, chunk, wsl, executor is not None, mirror, parity,
+                 start, ends)
+  try:
+    xs = next(steps)
+    while True:
+      xs = steps.send(evaluate(xs))
+  except StopIteration as stop:
+    return stop.value
+
+
+def _steps(bpa2, bma2, eps, nodes, shape, chunk, wsl, speculative, mirror = False, parity = None,
+           start = None, ends = None):
+  """
+  The walk done by `_walk()` (for any integrand), as a generator that
+    yields the lists of abscissas to evaluate and must be sent the
+    corresponding values of `f` (None where it raised ArithmeticError),
+    so the evaluation can be done elsewhere. Abscissas are yielded one
+    node (at each side) at a time or, if `speculative`, in speculative
+    chunks as described in `_walk()`, as are `mirror`, `parity`, `start`
+    and `ends`.
+  Returns (as the value of StopIteration) the tuple returned by
+    `_walk()`.
+  """
+
+  if speculative:
+    chunk *= 2
+  xpl, xmi, wpl, wmi = nodes
+  right, left = start or (0, 0)
+  nr, nl = ends or (len(xpl), len(xmi))
+  wsl = wsl or [0] * (shape[1] * shape[2])
+  nfe = [0, 0]
+  while right < nr or left < nl:
+    if speculative:
+      chunk = max(1, chunk // 2)
+    mr = min(chunk, nr - right)
+    ml = min(chunk, nl - left)
+    fx = yield [bpa2 + bma2 * x for x in xpl[right:right + mr] + (() if mirror else xmi[left:left + ml])]
+    fx = [_split(v, shape) for v in fx]
+    fr, fl = fx[:mr], fx[:mr] if mirror else fx[mr:]
+    nfe[0] += mr
+    nfe[1] += 0 if mirror else ml
+    for j in range(max(mr, ml)):
+      on_right = j < mr and right < nr
+      on_left = j < ml and left < nl
+      if not (on_right or on_left):
+        break
+      p = q = [0] * len(wsl)
+      if on_right:
+        p = [u * wpl[right] if mp.isnormal(u) else 0 for u in fr[j]]
+        right += 1
+      if on_left:
+        q = [v * wmi[left] if mp.isnormal(v) else 0 for v in fl[j]]
+        left += 1
+      if parity is not None and on_right and on_left:
+        _parity(parity, fr[j], fl[j], p, q)
+      pq = [u + v for u, v in zip(p, q)]
+      wsl = [u + v for u, v in zip(wsl, pq)]
+      # early tests (mainly for the sinh-sinh case), for both sides
+      # together and for each one on its own
+      if on_right and on_left and all(abs(u) <= abs(eps * v) for u, v in zip(pq, wsl)):
+        return (wsl, (right, left), tuple(nfe))
+      if on_right and all(abs(u) <= abs(eps * v) for u, v in zip(p, wsl)):
+        nr = right
+      if on_left and all(abs(u) <= abs(eps * v) for u, v in zip(q, wsl)):
+        nl = left
+  return (wsl, (right, left), tuple(nfe))
+
+
+def _parity(parity, fpl, fmi, p, q):
+  """
+  Updates the `parity` dict with the components `fpl` and `fmi` of the
+    values of an integrand at a pair of abscissas symmetric about the
+    centre point, and with those values weighted, `p` and `q`: its items
+    'even' and 'odd' (initially True) are cleared when such values show
+    that the integrand is not even or not odd, 'near' (initially None)
+    keeps the sum of the absolute values (of each component) at the
+    first pair, the nearest to the centre, and 'size' (initially None,
+    kept from level to level) accumulates those of the weighted values.
+  """
+
+  tol = _PARITY_TOL * mp.eps
+  for u, v in zip(fpl, fmi):
+    d = tol * (abs(u) + abs(v))
+    parity['even'] = parity['even'] and abs(u - v) <= d
+    parity['odd'] = parity['odd'] and abs(u + v) <= d
+  if parity['near'] is None:
+    parity['near'] = [abs(u) + abs(v) for u, v in zip(fpl, fmi)]
+  if parity['size'] is None:
+    parity['size'] = [0] * len(p)
+  parity['size'] = [w + abs(u) + abs(v) for w, u, v in zip(parity['size'], p, q)]
+
+
+class IntegrationState:
+  """
+  The state of an integral computed by `double_exponential()` (with the
+    mpmath backend), kept so that `resume()` can continue it. Its
+    contents are not part of the API.
+  """
+
+  def __init__(self, f, variant, bpa2, bma2, bpa2z, chg, rtol = None, atol = 0, max_evals = None,
+               symmetry = None):
+    self.f = f
+    self.limits = (variant, bpa2, bma2, bpa2z, chg)
+    self.symmetry = symmetry    # as in double_exponential(), once 'auto' is found out
+    self.rtol = rtol            # tolerances, as in double_exponential()
+    self.atol = atol
+    self.max_evals = max_evals
+    self.prec = mp.mp.prec      # working precision (bits)
+    self.shape = None           # shape of the values of f (see _shape())
+    self.f0 = None              # 1st series term (of each component)
+    self.s = None               # sum of weighted values (of each component)
+    self.level = -1             # last level computed
+    self.tnfe = 0               # Total Number of Function Evaluations
+    self.wsl = []               # weighted sum of each level
+    self.walked = []            # number of nodes walked at each level (right, left)
+    self.q_lvl = []             # computed value of integral at each level
+    self.parity = None          # parity found while symmetry is 'auto' (see _parity())
+    self.hint = None            # symmetry suggested by level 0, while 'auto'
+    self.inferred = None        # error of a 0 inferred from an 'auto' symmetry
+    self.stats = None           # IntegrationStats to fill, if any
+
+
+# the profiling counters of a level, in IntegrationStats.levels
+LevelStats = namedtuple('LevelStats', 'level f_ns nodes_ns fpl fmi skipped errors nodes truncated tmax')
+
+
+class IntegrationStats:
+  """
+  Profiling counters filled by `double_exponential()` (with the mpmath
+    backend) when given as its `stats` argument (and by `resume()` for
+    the same integral). Holds the totals:
+    * f_ns: nanoseconds spent evaluating `f` (waiting for the executor,
+      if any);
+    * nodes_ns: nanoseconds spent getting the abscissas and weights
+      (mostly building them, when not cached);
+    * fpl, fmi: number of evaluations at the right and at the left of
+      the centre of the interval (the evaluation at the centre is not
+      counted);
+    * skipped: number of abscissas (at both sides of the centre) not
+      walked thanks to the early termination tests;
+    * errors: number of ArithmeticErrors raised by `f` (taken as 0);
+  and `levels`, a list with a `LevelStats` named tuple for each level,
+    with the same counters for the level, plus:
+    * level: the level;
+    * nodes: the number of nodes of the level;
+    * truncated: True if the walk (of any side) reached the last node
+      of the level, whose t is the largest with exp(t) below the
+      truncation limit;
+    * tmax: the t of such last node.
+  The counters of the walks extended by `resume()` when raising the
+    precision are only added to the totals.
+  """
+
+  def __init__(self):
+    self.f_ns = 0
+    self.nodes_ns = 0
+    self.fpl = 0
+    self.fmi = 0
+    self.skipped = 0
+    self.errors = 0
+    self.levels = []
+
+  def _add(self, stats):
+    for name in ('f_ns', 'nodes_ns', 'fpl', 'fmi', 'skipped', 'errors'):
+      setattr(self, name, getattr(self, name) + getattr(stats, name))
+
+
+def _levels(state, executor = None, levelmax = None, tables = None):
+  """
+  The level loop of the mpmath backend of `double_exponential()`,
+    computing the levels after the last one in `state` (an
+    `IntegrationState`, updated in place), up to `levelmax` (by default,
+    the one given by `_limits()`), until converged or until the
+    evaluations budget of `state` would be exceeded. Nodes are taken
+    from `tables` (see `_shared_nodes()`), if given. A generator
+    yielding, after each level, a tuple with:
+    * the level;
+    * a list with the approximation to the integral (of each component)
+      reached at this level;
+    * the number of function evaluations so far;
+    * the shape of the values of `f` (see `_shape()`).
+  """
+
+  f = state.f
+  variant, bpa2, bma2, bpa2z, chg = state.limits
+  eps, thr, levelmax0, exptmax = _limits(variant, bpa2, bma2, bpa2z, mp.mp.prec, state.rtol)
+  levelmax = levelmax0 if levelmax is None else levelmax
+  stats = state.stats
+  counters = {'f_ns': 0, 'errors': 0} if stats is not None else None
+
+  if state.shape is None:
+    # the 1st series term is computed first, to find out the shape of f
+    x0 = _centre(state)
+    if stats is not None:
+      start = time.perf_counter_ns()
+    if executor is None:
+      try:
+        f0 = f(x0)
+      except ArithmeticError:
+        f0 = None
+    else:
+      f0 = _thaw(executor.submit(_call, f, mp.mp.prec, _freeze(mp.mpf(x0))).result())
+    if stats is not None:
+      counters['f_ns'] += time.perf_counter_ns() - start
+      counters['errors'] += f0 is None
+    _start(state, f0)
+    if state.symmetry == 'odd':
+      # the integral of an odd function is 0
+      state.f0 = [0] * len(state.f0)
+
+  # progress thru levels
+  for level in range(state.level + 1, levelmax + 1):
+    if stats is not None:
+      start = time.perf_counter_ns()
+    if tables is None:
+      nodes = _nodes(variant, mp.mp.prec, level, exptmax)
+    else:
+      nodes = _shared_nodes(tables, variant, mp.mp.prec, level, exptmax)
+    if stats is not None:
+      nodes_ns = time.perf_counter_ns() - start
+    if _over_budget(state, level, nodes):
+      break
+    # walk abscissas
+    mirror = state.symmetry == 'even'
+    parity = None
+    if state.symmetry == 'auto':
+      size = state.parity['size'] if state.parity else None
+      parity = state.parity = {'even': True, 'odd': True, 'near': None, 'size': size}
+    ends = _ends(state.walked, level, nodes)
+    if state.symmetry == 'odd':
+      wsl, walked, nfe = [0] * len(state.f0), (0, 0), (0, 0)
+    elif executor is None:
+      wsl, walked, nfe = _walk(f, bpa2, bma2, eps, nodes, state.shape, stats = counters,
+                               mirror = mirror, parity = parity, ends = ends)
+    else:
+      chunk = _chunk(state, level, nodes)
+      wsl, walked, nfe = _walk(f, bpa2, bma2, eps, nodes, state.shape, executor, chunk,
+                               stats = counters, mirror = mirror, parity = parity, ends = ends)
+    if parity is not None:
+      wsl = _symmetry(state, parity, wsl)
+    if stats is not None:
+      n = len(nodes[0])
+      h = 2.0 ** -level
+      stats.levels.append(LevelStats(level, counters['f_ns'], nodes_ns, nfe[0], nfe[1],
+                                     2 * n - sum(walked), counters['errors'], n, max(walked) == n,
+                                     (2 * n - 1) * h if level else n * h))
+      stats._add(stats.levels[-1])
+      counters = {'f_ns': 0, 'errors': 0}
+    q, converged = _account(state, level, wsl, walked, sum(nfe), thr)
+    yield (level, q, state.tnfe, state.shape)
+    if converged:
+      break
+  # end of level loop
+
+
+def _centre(state):
+  """
+  Returns the abscissa of the 1st series term for `state` (an
+    `IntegrationState`).
+  """
+
+  variant, bpa2, bma2, bpa2z, chg = state.limits
+  return bpa2 + bma2 if variant == 1 else bpa2
+
+
+def _start(state, f0):
+  """
+  Records in `state` (an `IntegrationState`) the 1st series term `f0`
+    (as returned by `f`, or None), which also tells the shape of `f`.
+  """
+
+  state.shape = _shape(f0)
+  state.f0 = _split(f0, state.shape)
+  state.s = [0] * len(state.f0)
+
+
+def _symmetry(state, parity, wsl):
+  """
+  Finds out the symmetry of the integrand of `state` (an
+    `IntegrationState` with symmetry 'auto') from the `parity` (see
+    `_parity()`) of its values at the nodes walked at a level, whose
+    weighted sum is `wsl`: 'even' or 'odd' (if its value at the centre
+    point is negligible, compared with those at the nearest nodes, too)
+    when all the values tell so, else None. That of level 0, whose nodes
+    are far from the centre, is only a hint, kept in `state`, which the
+    next level, whose nodes are nearer, must confirm (walking both sides
+    too) before the symmetry is used; otherwise the symmetry is None.
+    As the integral of an odd function is 0, in such case the sum and
+    the 1st series term of `state` and the returned `wsl` are zeroed,
+    and the even part that could have been missed (what the levels
+    would have added, plus the tolerance of the test for each node) is
+    kept in `state` as the error of the result.
+  """
+
+  tol = _PARITY_TOL * mp.eps
+  symmetry = None
+  if parity['near'] is not None and any(parity['size']):
+    if parity['even']:
+      symmetry = 'even'
+    elif parity['odd'] and all(abs(u) <= tol * v for u, v in zip(state.f0, parity['near'])):
+      symmetry = 'odd'
+  if state.level < 0 and symmetry is not None:
+    # level 0 (not accounted yet): wait for the next one
+    state.hint = symmetry
+    return wsl
+  state.symmetry = symmetry if symmetry == state.hint else None
+  if state.symmetry == 'odd':
+    variant, bpa2, bma2, bpa2z, chg = state.limits
+    h = 2.0 ** -(state.level + 1)
+    state.inferred = [abs(bma2) * mp.pi() / 2 * h * (abs(u + v) + tol * w)
+                      for u, v, w in zip(state.s, wsl, parity['size'])]
+    state.s = [0] * len(state.s)
+    state.f0 = [0] * len(state.f0)
+    wsl = [0] * len(wsl)
+  return wsl
+
+
+def _over_budget(state, level, nodes):
+  """
+  Returns True if walking `nodes`, those of level `level`, would exceed
+    the evaluations budget of `state` (an `IntegrationState`),
+    estimating it walks twice as many nodes as the previous level.
+  """
+
+  if not level or state.max_evals is None:
+    return False
+  right, left = (min(len(nodes[0]), 2 * walked) for walked in state.walked[-1])
+  return state.tnfe + right + (0 if state.symmetry == 'even' else left) > state.max_evals
+
+
+def _ends(walked, level, nodes):
+  """
+  Returns a tuple with the number of `nodes` (those of level `level`)
+    that can be walked at the right and at the left of the centre point,
+    being `walked` the numbers of nodes walked at each side at the
+    previous levels (as `IntegrationState.walked`): all of them but,
+    beyond level 0, for a side whose walk stopped at level 0 before that
+    of the other side, those not beyond (in t) one level 0 step past its
+    last node walked at level 0, as deeper walks stop at about the same
+    point.
+  """
+
+  n = len(nodes[0])
+  if not level:
+    return (n, n)
+  right, left = walked[0]
+  # at level 0, the k-th node has t = k; at the next ones, the i-th node
+  # has t = (2i - 1) h
+  h = 2.0 ** -level
+  cap = lambda k: min(n, int(((k + 1) / h + 1) / 2))
+  return (cap(right) if right < left else n, cap(left) if left < right else n)
+
+
+def _chunk(state, level, nodes):
+  """
+  Returns the size of the 1st speculative chunk of `nodes`, those of
+    level `level`, for `state` (an `IntegrationState`).
+  """
+
+  # speculate that the walk reaches, at least, as far as at the
+  # previous level (where abscissas were half as dense, but at level 0)
+  walked = max(state.walked[-1]) if level else 0
+  return len(nodes[0]) if not level else walked if level == 1 else 2 * walked
+
+
+def _account(state, level, wsl, walked, nfe, thr):
+  """
+  Adds to `state` (an `IntegrationState`) the walk of level `level`, as
+    returned by `_walk()`. `thr` is the relative convergence threshold
+    given by `_limits()`.
+  Returns a tuple with:
+    * a list with the approximation to the integral (of each component)
+      reached at this level;
+    * True if the integral has converged.
+  """
+
+  variant, bpa2, bma2, bpa2z, chg = state.limits
+  pi2 = mp.pi() / 2
+  h = 2.0 ** -level           # rectangle width
+  state.tnfe += nfe
+  state.s = [u + v for u, v in zip(state.s, wsl)]
+  # add the 1st series term
+  if not level:
+    state.s = [u + v for u, v in zip(state.s, state.f0)]
+    state.tnfe += 1
+  state.level = level
+  state.wsl.append(wsl)
+  state.walked.append(walked)
+
+  # apply constant coefficients
+  q = [v * bma2 * pi2 * h for v in state.s]
+  if chg:
+    q = [-v for v in q]
+  state.q_lvl.append(q)
+
+  # converged?
+  if state.rtol is None:
+    if all(not u or (abs(2 * abs(v) - abs(u)) < abs(thr * u)) for u, v in zip(state.s, wsl)):
+      return (q, True)
+  # or, with explicit tolerances, is the error estimation small enough?
+  if level and (state.rtol is not None or state.atol):
+    rtol = state.rtol or 0
+    if all(e <= max(rtol * abs(u), state.atol) for u, e in zip(q, _errors(state))):
+      return (q, True)
+  return (q, False)
+
+
+def _estimate(qs, eps):
+  """
+  Estimates the error of `qs[0]`, the approximation to an integral
+    reached at a level, from those reached at the previous levels,
+    `qs[1]`, `qs[2]` and `qs[3]`. When the digits of these three
+    (roughly those in common with `qs[0]`) have grown at least
+    `_DIGITS_DOUBLING` times from one to the next, the digits of `qs[0]`
+    are predicted from such growth, but never more than `_DIGITS_GROWTH`
+    times those of `qs[1]`, and then two digits are taken off for
+    safety. The estimation is not below the relative size `eps` where
+    the abscissa walk is cut (see `_limits()`), nor below 10 times the
+    square root of the working precision, the accuracy the walk reaches
+    for an inverse square root singularity at an end of the interval.
+    Otherwise, or if it were larger, the difference between `qs[0]` and
+    `qs[1]` is returned.
+  """
+
+  q = abs(qs[0])
+  d = [abs(qs[0] - u) for u in qs[1:4]]
+  if len(d) < 3 or not 0 < d[0] < d[1] < d[2] < q:
+    return d[0]
+  l1, l2, l3 = [mp.log10(u / q) for u in d]   # - digits of qs[1:4]
+  if l1 > _DIGITS_DOUBLING * l2 or l2 > _DIGITS_DOUBLING * l3:
+    return d[0]
+  digits = min(l1 * l1 / -l2, -_DIGITS_GROWTH * l1) - 2
+  return min(d[0], q * max(mp.power(10, -digits), eps, 10 * mp.sqrt(mp.eps)))
+
+
+def _errors(state):
+  """
+  Returns a list with the error estimation of the last approximation
+    reached for `state` (an `IntegrationState`, with two levels at
+    least), of each component, as given by `_estimate()`.
+  """
+
+  eps = _limits(*state.limits[:4], mp.mp.prec, state.rtol)[0]
+  return [_estimate(qs, eps) for qs in zip(*state.q_lvl[:-5:-1])]
+
+
+def _restart(state):
+  """
+  Discards the levels computed for `state` (an `IntegrationState`), so
+    that they are computed again, at the current working precision, by
+    `_levels()`. The function evaluations already done are still counted
+    and the symmetry already found out is kept.
+  """
+
+  state.prec = mp.mp.prec
+  state.shape = state.f0 = state.s = None
+  state.level = -1
+  state.wsl = []
+  state.walked = []
+  state.q_lvl = []
+
+
+def _lift(state, executor = None):
+  """
+  Applies the tightened `rtol` of `state` (an `IntegrationState`),
+    continuing the walk of each level already computed where it stopped,
+    now with its stricter early termination test.
+  """
+
+  f = state.f
+  variant, bpa2, bma2, bpa2z, chg = state.limits
+  eps, thr, levelmax, exptmax = _limits(variant, bpa2, bma2, bpa2z, mp.mp.prec, state.rtol)
+  for level in range(state.level + 1):
+    nodes = _nodes(variant, mp.mp.prec, level, exptmax)
+    start = state.walked[level]
+    ends = _ends(state.walked, level, nodes)
+    if (start[0] < ends[0] or start[1] < ends[1]) and state.symmetry != 'odd':
+      counters = {'f_ns': 0, 'errors': 0} if state.stats is not None else None
+      mirror = state.symmetry == 'even'
+      wsl, walked, nfe = _walk(f, bpa2, bma2, eps, nodes, state.shape, executor, 1, state.wsl[level],
+                               counters, mirror, start = start, ends = ends)
+      if counters is not None:
+        n = len(nodes[0])
+        state.stats._add(LevelStats(level, counters['f_ns'], 0, nfe[0], nfe[1],
+                                    0, counters['errors'], n, max(walked) == n, 0))
+      state.wsl[level] = wsl
+      state.walked[level] = walked
+      state.tnfe += sum(nfe)
+  state.s = [mp.fsum(v) for v in zip(state.f0, *state.wsl)]
+
+
+def _trivial(a, b):
+  """
+  Returns the result of `double_exponential()` for an integral from `a`
+    to `b` that needs no computation, as either end is NaN or `a` equals
+    `b`, or None if it does need it.
+  """
+
+  if mp.isnan(a) or mp.isnan(b):
+    return (mp.nan, mp.nan, 0, 0, 0, [])
+  if a == b:
+    return (0, 0, 0, 0, 0, [])
+  return None
+
+
+def _checked(s, sp, est = None, zero = 0):
+  """
+  Checks for bad results the list `s` with the approximation of each
+    component reached at the last level, given the list `sp` with those
+    at the previous one: when their difference is not 10 times smaller
+    than the approximation, all its digits are considered corrupted by
+    roundoff, so it is replaced by `zero` and its error estimation is
+    the sum of both. Otherwise, the error estimation is that in the list
+    `est`, or the difference if it is None.
+  Returns a tuple with the list of checked approximations and that of
+    their error estimations.
+  """
+
+  s = list(s)
+  err = [abs(u - v) for u, v in zip(sp, s)]
+  est = err if est is None else est
+  for k in range(len(s)):
+    if 10 * err[k] >= abs(s[k]):
+      err[k] = abs(err[k]) + abs(s[k])
+      s[k] = zero
+    else:
+      err[k] = est[k]
+  return (s, err)
+
+
+def _result(state, levels):
+  """
+  Runs the level generator `levels` to its end and returns the result
+    of `double_exponential()` for `state` (an `IntegrationState`),
+    checked for bad results.
+  """
+
+  for _ in levels:
+    pass
+  q_lvl = state.q_lvl
+  s = q_lvl[-1]
+  sp = q_lvl[-2] if len(q_lvl) > 1 else [0] * len(s)
+
+  # check for bad results
+  est = None
+  if len(q_lvl) > 1 and (state.rtol is not None or state.atol):
+    est = _errors(state)
+  s, err = _checked(s, sp, est)
+  if state.inferred is not None:
+    err = [max(u, v) for u, v in zip(err, state.inferred)]
+
+  shape = state.shape
+  s = _join(s, shape)
+  err = _join(err, shape)
+  q_lvl = [_join(v, shape) for v in q_lvl]
+  return (s, err, state.tnfe, state.level, state.limits[0], q_lvl)
+
+
+def double_exponential(f, a, b, backend = 'mpmath', executor = None, return_state = False,
+                       rtol = None, atol = 0, max_evals = None, stats = None, symmetry = None,
+                       weight = None, omega = None):
   """
   Computes the integral of function `f` from `a` to `b`, using the double
     exponential method. Accepts `+mp.inf`/`-mp.inf` as interval ends
@@ -12,11 +1259,85 @@ def double_exponential(f, a, b):
     * an error estimation;
     * the number of function evaluations needed for the computation;
     * the level reached during computation;
-    * the variant used: tanh-sinh (0); exp-sinh (1); or sinh-sinh (2)
+    * the variant used: tanh-sinh (0); exp-sinh (1); sinh-sinh (2); or
+      Ooura-Mori (3)
     * a list with the approximations reached at each level
 
   Uses mpmath and works with the pre-existing `mp.dps` precision.
 
+  By default, the computation aims at a result accurate to that
+    precision, and usually gets it while the reported error estimation
+    (the difference with the previous level) is much larger. Instead,
+    with `rtol` or `atol` given, levels are computed until the error
+    estimation is below `max(rtol * abs(s), atol)`, being `s` the
+    integral, and the abscissa walk is cut at the relative size `rtol`,
+    so a low accuracy (e.g. `rtol = 1e-6` at 30 digits working
+    precision) needs fewer function evaluations. In such case, the error
+    estimation (also the reported one) predicts the digits of the last
+    level from those gained at the previous ones, when they have been
+    roughly doubling at each level, so the computation may end one
+    level earlier than waiting for the difference with the previous
+    level to get below the tolerance. If `max_evals` is
+    given, no level is started when it would (by estimation) exceed
+    that number of function evaluations.
+
+  `f` can also return a tuple, a list or an mpmath matrix, so several
+    integrals over the same interval (e.g. the moments of a function)
+    are computed at once, sharing the abscissas and any subexpression
+    common to all of them. In such case the integral, the error
+    estimation and the approximations at each level are returned with
+    the same type and shape, computed component by component, and the
+    computation only ends when all components have converged. The type
+    of the values returned by `f` is found out evaluating it at the
+    centre of the interval, so it must not raise an exception there.
+
+  With `backend = 'numpy'` the computation is done in float64 arithmetic
+    using numpy, which is much faster but only valid for `mp.dps <= 15`.
+    In this case `f` is called once per level with an ndarray holding all
+    the abscissas of the level and must return an ndarray (or a scalar)
+    with the corresponding values, e.g.: `lambda x: 2/(1 + x**2)` or
+    `numpy.exp`. The integral, error estimation and approximations are
+    returned as Python floats (or complexes). All abscissas of a level
+    are evaluated, so the reported number of function evaluations is
+    larger than with the mpmath backend, and the computed sums are
+    truncated where the terms of both sides together become negligible
+    (instead of each side on its own, as the mpmath walk does), so they
+    may hold a few more terms.
+
+  When evaluating `f` is expensive, an `executor` (as those in
+    `concurrent.futures`) can be given, so all the abscissas of a level
+    are sent to it together (in fact, in speculative chunks, as the walk
+    thru abscissas may end early), and wall time becomes proportional to
+    the number of levels instead of to the number of function
+    evaluations. With a `ProcessPoolExecutor`, `f` must be picklable (so
+    not a lambda); with a `ThreadPoolExecutor`, beware that mpmath keeps
+    its working precision in a global context, which many of its
+    functions change temporarily. The number of function evaluations
+    reported includes the speculative ones.
+
+  With `return_state = True` (only for the mpmath backend), an opaque
+    `IntegrationState` is appended to the returned tuple, which can be
+    given to `resume()` to continue the computation with more levels, a
+    stricter tolerance or a higher precision, without evaluating again
+    the abscissas already evaluated.
+
+  To find out where the time goes, an `IntegrationStats` can be given
+    as `stats` (only for the mpmath backend), which is filled with
+    profiling counters for the whole computation and for each level.
+    Without it, nothing is measured.
+
+  For a finite interval or for (-inf, +inf), if `f` is known to be even
+    about the centre of the interval (`symmetry = 'even'`), it is only
+    evaluated at the right of the centre, halving the number of function
+    evaluations; if it is known to be odd (`symmetry = 'odd'`) the
+    integral is 0 and `f` is only evaluated at the centre (to find out
+    the type of its values). With `symmetry = 'auto'` the values of `f`
+    at the abscissas of level 0 (all evaluated) hint whether it is even,
+    odd or none of them; if so, those at level 1 (all evaluated too),
+    nearer the centre, must confirm it, and the next levels are
+    computed accordingly (only for the mpmath backend; ignored for other
+    intervals).
+
   If the computed error estimation is not much smaller than the computed
     result, it is assumed that all digits of the result are corrupted by
     roundoff. In such cases, the reported result is 0 and the reported
@@ -24,199 +1345,1623 @@ def double_exponential(f, a, b):
     computed result and error. This usually happens when the integral
     evaluates to 0.
 
-  The double exponential method relies on the function to be
-    integrated being analytic over the integration interval, except,
-    perhaps, at the interval ends. Thus, if it is known that the
-    integrand, _or any of its derivatives_, has a discontinuity at some
-    point inside the integration interval, it is advised to break the
-    interval at such point and compute two separate integrals, one
-    at each side of the problematic point. Better results will be
-    get this way. Thus, beware of `abs`, `fp`, `ip` and such non analytic
-    functions inside the integrand program. Other methods may behave
-    better in this respect, but, on the other side, the double
-    exponential method manages discontinuities (of the integrand or its
-    derivatives) at the interval edges better and is usually way faster.
+  The double exponential method relies on the function to be
+    integrated being analytic over the integration interval, except,
+    perhaps, at the interval ends. Thus, if it is known that the
+    integrand, _or any of its derivatives_, has a discontinuity at some
+    point inside the integration interval, it is advised to break the
+    interval at such point and compute two separate integrals, one
+    at each side of the problematic point. Better results will be
+    get this way. Thus, beware of `abs`, `fp`, `ip` and such non analytic
+    functions inside the integrand program. Other methods may behave
+    better in this respect, but, on the other side, the double
+    exponential method manages discontinuities (of the integrand or its
+    derivatives) at the interval edges better and is usually way faster.
+
+  As many other quadrature methods the double exponential algorithm does
+    not manage well highly oscillatory integrands. Here, highly
+    oscillatory means that the integrand changes sign many (or infinite)
+    times along the integration interval. The exception are Fourier-type
+    integrals over an interval with an infinite end: with `weight =
+    'sin'` (or `'cos'`) and `omega` given, the integral of `f(x) *
+    sin(omega * x)` (or of `f(x) * cos(omega * x)`) is computed with the
+    Ooura-Mori transform, whose abscissas approach the zeros of the
+    weight, so a few hundred evaluations of the non oscillatory `f`
+    usually suffice at 15 digits. Each level uses its own abscissas (none is
+    reused from the previous level) and, unless the finite end of the
+    interval is 0, the weight is split into a sine and a cosine with
+    their own abscissas, doubling the evaluations. Only the mpmath
+    backend without an executor, state, stats nor symmetry supports it.
+  """
+
+  if backend not in ('mpmath', 'numpy'):
+    raise ValueError("unknown backend '%s'" % backend)
+
+  if backend == 'numpy' and executor is not None:
+    raise ValueError('the numpy backend cannot use an executor')
+
+  if backend == 'numpy' and return_state:
+    raise ValueError('the numpy backend cannot return a state')
+
+  if backend == 'numpy' and stats is not None:
+    raise ValueError('the numpy backend cannot fill stats')
+
+  if symmetry not in (None, 'even', 'odd', 'auto'):
+    raise ValueError("unknown symmetry '%s'" % symmetry)
+
+  if backend == 'numpy' and symmetry is not None:
+    raise ValueError('the numpy backend cannot exploit symmetry')
+
+  if weight not in (None, 'sin', 'cos'):
+    raise ValueError("unknown weight '%s'" % weight)
+
+  if (weight is None) != (omega is None):
+    raise ValueError('weight and omega must be given together')
+
+  if weight is not None:
+    if backend != 'mpmath' or executor is not None or return_state or stats is not None or \
+       symmetry is not None:
+      raise ValueError('a weight can only be used with the plain mpmath backend')
+    if not omega > 0:
+      raise ValueError('omega must be positive')
+    if mp.isinf(a) == mp.isinf(b):
+      raise ValueError('a weight needs an interval with one infinite end')
+
+  result = _trivial(a, b)
+  if result is not None:
+    return result + ((None,) if return_state else ())
+
+  if weight is not None:
+    return _ooura_mori(f, a, b, weight, mp.mpf(omega), rtol, atol, max_evals)
+  variant, bpa2, bma2, bpa2z, chg = _classify(a, b)
+  if variant == 1:
+    if symmetry in ('even', 'odd'):
+      raise ValueError('symmetry needs a finite interval or (-inf, +inf)')
+    symmetry = None
+  if backend == 'numpy':
+    return _double_exponential_numpy(f, variant, bpa2, bma2, bpa2z, chg, rtol, atol, max_evals)
+  state = IntegrationState(f, variant, bpa2, bma2, bpa2z, chg, rtol, atol, max_evals, symmetry)
+  state.stats = stats
+  result = _result(state, _levels(state, executor))
+  return result + (state,) if return_state else result
+
+
+def resume(state, extra_levels = None, tol = None, executor = None):
+  """
+  Continues the computation of an integral from the `state` returned by
+    `double_exponential(..., return_state = True)`, halving the step
+    beyond the last level computed, without evaluating again the
+    abscissas already evaluated. `state` is updated in place, so it can
+    be resumed once more, and the result is returned as the one of
+    `double_exponential(..., return_state = True)`.
+
+  At most `extra_levels` levels are added (by default, up to the
+    maximum level for the working precision, but at least one). `tol`,
+    if given, replaces the relative tolerance of `state` (see `rtol` in
+    `double_exponential()`).
+
+  If `tol` is stricter than the former tolerance, the walk of the levels
+    already computed is first continued with its stricter termination
+    test, so only new abscissas are evaluated. If the working precision
+    (`mp.prec`) is now higher than when `state` was computed, the values
+    already computed, whose rounding errors are those of the former
+    precision, would keep the result from converging, so all levels are
+    computed again (with all their abscissas) at the new precision. A
+    lower working precision is ignored.
+  """
+
+  tighter = tol is not None and state.rtol is not None and tol < state.rtol
+  if tol is not None:
+    state.rtol = tol
+  with mp.workprec(max(mp.mp.prec, state.prec)):
+    if extra_levels is None:
+      variant, bpa2, bma2, bpa2z, chg = state.limits
+      levelmax = max(_limits(variant, bpa2, bma2, bpa2z, mp.mp.prec, state.rtol)[2], state.level + 1)
+    else:
+      levelmax = state.level + extra_levels
+    if mp.mp.prec > state.prec:
+      _restart(state)
+    elif tighter:
+      _lift(state, executor)
+    return _result(state, _levels(state, executor, levelmax)) + (state,)
+
+
+# the record yielded by iter_double_exponential() after each level
+LevelEstimate = namedtuple('LevelEstimate', 'level s err tnfe elapsed')
+
+
+def iter_double_exponential(f, a, b, executor = None):
+  """
+  Computes the integral of function `f` from `a` to `b`, as
+    `double_exponential()` does (with the mpmath backend), but as a
+    generator yielding, after each level, a `LevelEstimate` named tuple
+    with:
+    * level: the level just computed;
+    * s: the approximation to the integral reached at this level;
+    * err: an error estimation (the difference with the approximation
+      at the previous level);
+    * tnfe: the number of function evaluations done so far;
+    * elapsed: the seconds spent computing so far (not including the
+      time the caller spends between iterations).
+
+  The generator ends when the integral converges or the maximum level
+    is reached, but the caller can stop iterating at any point, keeping
+    the last approximation. Unlike `double_exponential()`, results are
+    not checked for corruption by roundoff.
+  """
+
+  elapsed = 0
+  start = time.perf_counter()
+  if mp.isnan(a) or mp.isnan(b):
+    yield LevelEstimate(0, mp.nan, mp.nan, 0, time.perf_counter() - start)
+    return
+
+  if a == b:
+    yield LevelEstimate(0, 0, 0, 0, time.perf_counter() - start)
+    return
+
+  sp = None
+  state = IntegrationState(f, *_classify(a, b))
+  for level, s, tnfe, shape in _levels(state, executor):
+    err = [abs(u - v) for u, v in zip(sp, s)] if sp else [abs(v) for v in s]
+    elapsed += time.perf_counter() - start
+    yield LevelEstimate(level, _join(s, shape), _join(err, shape), tnfe, elapsed)
+    start = time.perf_counter()
+    sp = s
+
+
+async def adouble_exponential(f, a, b, concurrency = None, rtol = None, atol = 0, max_evals = None):
+  """
+  Computes the integral of function `f` from `a` to `b`, as
+    `double_exponential()` does (with the mpmath backend, returning the
+    same tuple), for an `f` that is a coroutine function (e.g. an `async
+    def`), so the event loop is not blocked while `f` is awaited. The
+    abscissas of each level are awaited concurrently (in speculative
+    chunks, as when `double_exponential()` is given an executor), with
+    at most `concurrency` calls to `f` pending at once (no limit if it
+    is None).
+
+  The reported number of function evaluations does not include the
+    speculative ones, so the result equals that of `double_exponential()`
+    for the synchronous version of `f`. If this coroutine is cancelled,
+    the pending calls to `f` are cancelled too. `mp.dps` must not be
+    changed while it runs.
+  """
+
+  result = _trivial(a, b)
+  if result is not None:
+    return result
+
+  semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+  async def value(x):
+    try:
+      if semaphore is None:
+        return await f(x)
+      async with semaphore:
+        return await f(x)
+    except ArithmeticError:
+      return None
+
+  state = IntegrationState(f, *_classify(a, b), rtol, atol, max_evals)
+  variant, bpa2, bma2, bpa2z, chg = state.limits
+  eps, thr, levelmax, exptmax = _limits(variant, bpa2, bma2, bpa2z, mp.mp.prec, rtol)
+  # the 1st series term is computed first, to find out the shape of f
+  _start(state, await value(_centre(state)))
+  # progress thru levels
+  for level in range(levelmax + 1):
+    nodes = _nodes(variant, mp.mp.prec, level, exptmax)
+    if _over_budget(state, level, nodes):
+      break
+    # walk abscissas
+    steps = _steps(bpa2, bma2, eps, nodes, state.shape, _chunk(state, level, nodes), None, True,
+                   ends = _ends(state.walked, level, nodes))
+    try:
+      xs = next(steps)
+      while True:
+        xs = steps.send(await asyncio.gather(*(value(x) for x in xs)))
+    except StopIteration as stop:
+      wsl, walked, nfe = stop.value
+    q, converged = _account(state, level, wsl, walked, sum(walked), thr)
+    if converged:
+      break
+  # end of level loop
+  return _result(state, ())
+
+
+@lru_cache(maxsize = 256)
+def _nodes_numpy(variant, level, exptmax):
+  """
+  Same as `_nodes()`, but returns float64 ndarrays.
+  """
+
+  nodes = tuple(np.array(tuple(v), dtype = float) for v in _nodes(variant, 53, level, exptmax))
+  for v in nodes:
+    v.flags.writeable = False
+  return nodes
+
+
+def _feval_numpy(f, x, ps = None):
+  """
+  Evaluates `f` on the ndarray `x`, zeroing non finite values.
+  If `ps` is given, `f(x, ps)` is evaluated instead, with `x` as a
+    column and the ndarray `ps` as a row, so the result has a row for
+    each element of `x` and a column for each element of `ps`.
+  If `f` raises an ArithmeticError, it is evaluated element by element
+    of `x`, zeroing the values where the exception is raised.
+  """
+
+  if ps is None:
+    g = f
+    shape = x.shape
+  else:
+    g = lambda x: f(np.reshape(x, (-1, 1)), np.reshape(ps, (1, -1)))
+    shape = (len(x), len(ps))
+  with np.errstate(all = 'ignore'):
+    try:
+      fx = np.asarray(g(x))
+    except ArithmeticError:
+      fx = []
+      for i in range(len(x)):
+        try:
+          fx.append(f(x[i]) if ps is None else np.broadcast_to(g(x[i:i + 1]), (1,) + shape[1:])[0])
+        except ArithmeticError:
+          fx.append(np.zeros(shape[1:]))
+      fx = np.asarray(fx)
+    if not np.issubdtype(fx.dtype, np.inexact):
+      fx = fx.astype(float)
+    fx = np.broadcast_to(fx, shape)
+    return np.where(np.isfinite(fx), fx, 0)
+
+
+def _double_exponential_numpy(f, variant, bpa2, bma2, bpa2z, chg, rtol = None, atol = 0, max_evals = None):
+  """
+  The numpy (float64) backend of `double_exponential()`, for integrals
+    already classified by `_classify()`, with tolerances as given to it.
+  """
+
+  eps, thr, levelmax, exptmax, bpa2, bma2 = _limits_numpy(variant, bpa2, bma2, bpa2z, rtol)
+  pi2 = np.pi / 2
+
+  s = 0                       # s is the computed integral
+  h = 2                       # rectangle width
+  tnfe = 0                    # Total Number of Function Evaluations
+  q_lvl = []                  # computed value of integral at each level
+  # progress thru levels
+  for level in range(levelmax + 1):
+    xpl, xmi, wpl, wmi = _nodes_numpy(variant, level, exptmax)
+    n = len(xpl)
+    # stop if the level would exceed the evaluations budget
+    if level and max_evals is not None and tnfe + 2 * n > max_evals:
+      level -= 1
+      break
+    # sp = s at previous level
+    sp = s * bma2 * pi2 * h
+    if chg:
+      sp = -sp
+    if level:
+      q_lvl.append(sp)
+    h /= 2
+    # evaluate all abscissas at once
+    fx = _feval_numpy(f, bpa2 + bma2 * np.concatenate((xpl, xmi)))
+    tnfe += 2 * n
+    p = fx[:n] * wpl + fx[n:] * wmi
+    # truncate as the sequential abscissa walk does for both sides
+    # together
+    wsl = np.cumsum(p)
+    stop = np.flatnonzero(np.abs(p) <= np.abs(eps * wsl))
+    wsl = wsl[stop[0] if len(stop) else n - 1].item()
+
+    s += wsl
+    # add the 1st series term
+    if not level:
+      s += _feval_numpy(f, np.array([bpa2 + bma2 if variant == 1 else bpa2]))[0].item()
+      tnfe += 1
+
+    # converged?
+    if rtol is None:
+      if not s or (abs(2 * abs(wsl) - abs(s)) < abs(thr * s)):
+        break
+    # or, with explicit tolerances, is the error estimation small enough?
+    if level and (rtol is not None or atol):
+      q = s * bma2 * pi2 * h
+      if chg:
+        q = -q
+      e = _estimate([q] + q_lvl[:-4:-1], eps)
+      if e <= max((rtol or 0) * abs(q), atol):
+        break
+  # end of level loop
+
+  # iteration done, apply constant coefficients
+  s *= bma2 * pi2 * h
+  if chg:
+    s = -s
+  q_lvl.append(s)
+
+  # check for bad results
+  est = None
+  if level > 1 and (rtol is not None or atol):
+    est = [float(_estimate(q_lvl[:-5:-1], eps))]
+  (s,), (err,) = _checked([s], [sp], est, 0.0)
+
+  return (s, err, tnfe, level, variant, q_lvl)
+
+
+@lru_cache(maxsize = 256)
+def _nodes_ooura_mori(weight, prec, level):
+  """
+  Computes the nodes used at level `level` by the Ooura-Mori transform
+    x = M * phi(t) / omega, being phi(t) = t / (1 - exp(-2 * t - alpha *
+    (1 - exp(-t)) - beta * (exp(t) - 1))), for the weight `weight`
+    ('sin' or 'cos') of the integrand, working with `prec` bits. With
+    the step h = 2 ** -level and M = pi / h, the abscissas approach, as t
+    grows, the zeros of the weight, so the terms of the series decay
+    double exponentially at both ends.
+  Returns a tuple with, for the nodes at t >= 0 and for those at t < 0
+    (in increasing order of abs(t)), a tuple with:
+    * the abscissas, times omega;
+    * the weights, times the weight of the integrand at the abscissa;
+    * the index of the first node beyond which the terms decay
+      monotonically (unless the integrand does not), from where the
+      walk can stop early.
+  Results are cached (LRU).
+  """
+
+  with mp.workprec(prec + 20):
+    pi = mp.pi()
+    h = mp.ldexp(1, -level)   # rectangle width
+    M = pi / h
+    beta = mp.mpf(1) / 4
+    alpha = beta / mp.sqrt(1 + M * mp.log(1 + M) / (4 * pi))
+    teps = mp.power(10, -mp.mp.dps)
+    shift = 0 if weight == 'sin' else mp.mpf(1) / 2
+    sides = []
+    for sign in (1, -1):
+      xs, ws, k0 = [], [], None
+      k = 0
+      while True:
+        t = (k + shift) * h if sign == 1 else -(k + 1 - shift) * h
+        if t:
+          e = -2 * t + alpha * mp.expm1(-t) - beta * mp.expm1(t)
+          de = -2 - alpha * mp.exp(-t) - beta * mp.exp(t)
+          q = -mp.expm1(e)    # 1 - exp(e)
+          phi = t / q
+          dphi = (q + t * mp.exp(e) * de) / q ** 2
+        else:
+          e1 = -2 - alpha - beta
+          phi = -1 / e1
+          dphi = ((alpha - beta) / 2 + e1 ** 2 / 2) / e1 ** 2
+        x = M * phi
+        if t > 0:
+          # the weight at x = (k + shift) * pi + d, being d small
+          d = M * t * mp.exp(e) / q
+          w = (-1 if k % 2 else 1) * (mp.sin(d) if weight == 'sin' else -mp.sin(d))
+          small = abs(d)
+        else:
+          w = mp.sin(x) if weight == 'sin' else mp.cos(x)
+          small = x
+        if k0 is None and small < 1:
+          k0 = len(xs)
+        xs.append(+x)
+        ws.append(w * dphi)
+        # done with the side?
+        if (t > 0 and abs(d) < teps) or (t <= 0 and x < teps ** 2):
+          break
+        k += 1
+      sides.append((tuple(xs), tuple(ws), k0))
+  return tuple(sides)
+
+
+def _ooura_mori(f, a, b, weight, omega, rtol = None, atol = 0, max_evals = None):
+  """
+  The Ooura-Mori variant of `double_exponential()`, computing the
+    integral of `f(x) * sin(omega * x)` (`weight = 'sin'`) or of
+    `f(x) * cos(omega * x)` (`weight = 'cos'`) over an interval with an
+    infinite end, with the other arguments as given to it.
+  """
+
+  # reverse the interval if needed
+  chg = a > b
+  if chg:
+    a, b = b, a
+  # x = c + sign * u, with u in [0, +inf)
+  c, sign = (a, 1) if b == mp.inf else (b, -1)
+  # weight(omega * x) as the sum of coef * weight(omega * u) for each part
+  if weight == 'sin':
+    parts = [('cos', mp.sin(omega * c)), ('sin', sign * mp.cos(omega * c))]
+  else:
+    parts = [('cos', mp.cos(omega * c)), ('sin', -sign * mp.sin(omega * c))]
+  parts = [(w, coef) for w, coef in parts if coef]
+
+  # digits aimed at (see _limits())
+  dps = _digits(rtol)
+  eps = mp.power(10, -dps)
+  thr = mp.sqrt(eps)
+  levelmax = int(round(mp.log(dps, 2)) + 2)
+  if rtol is not None:
+    levelmax += 1
+
+  shape = None
+  def values(u):
+    try:
+      return f(c + sign * u)
+    except ArithmeticError:
+      return None
+
+  tnfe = 0                    # Total Number of Function Evaluations
+  q_lvl = []                  # computed value of integral at each level
+  for level in range(levelmax + 1):
+    nodes = [(coef, _nodes_ooura_mori(w, mp.mp.prec, level)) for w, coef in parts]
+    # stop if the level would exceed the evaluations budget
+    n = sum(len(side[0]) for coef, sides in nodes for side in sides)
+    if level and max_evals is not None and tnfe + n > max_evals:
+      break
+    q = None
+    for coef, sides in nodes:
+      s = None                # weighted sum of the part
+      for xs, ws, k0 in sides:
+        for k in range(len(xs)):
+          v = values(xs[k] / omega)
+          tnfe += 1
+          if shape is None:
+            shape = _shape(v)
+          p = [u * ws[k] for u in _split(v, shape)]
+          s = p if s is None else [u + v for u, v in zip(s, p)]
+          # negligible contribution?
+          if k >= k0 and all(abs(u) <= abs(eps * v) for u, v in zip(p, s)):
+            break
+      s = [coef * v for v in s]
+      q = s if q is None else [u + v for u, v in zip(q, s)]
+    q = [mp.pi() / omega * v for v in q]
+    if chg:
+      q = [-v for v in q]
+    q_lvl.append(q)
+    if not level:
+      continue
+    # converged?
+    if rtol is None:
+      if all(abs(u - v) <= abs(thr * u) for u, v in zip(q, q_lvl[-2])):
+        break
+    # or, with explicit tolerances, is the error estimation small enough?
+    if rtol is not None or atol:
+      err = [_estimate(qs, eps) for qs in zip(*q_lvl[:-5:-1])]
+      if all(e <= max((rtol or 0) * abs(u), atol) for u, e in zip(q, err)):
+        break
+  # end of level loop
+
+  # check for bad results
+  level = len(q_lvl) - 1
+  s = q_lvl[-1]
+  sp = q_lvl[-2] if level else [0] * len(s)
+  est = None
+  if level > 1 and (rtol is not None or atol):
+    est = [_estimate(qs, eps) for qs in zip(*q_lvl[:-5:-1])]
+  s, err = _checked(s, sp, est)
+
+  q_lvl = [_join(v, shape) for v in q_lvl]
+  return (_join(s, shape), _join(err, shape), tnfe, level, 3, q_lvl)
+
+
+def double_exponential_auto(f, a, b, rtol = None, atol = 0, f_numpy = None, dps_max = None):
+  """
+  Computes the integral of function `f` from `a` to `b`, as
+    `double_exponential()` does, but trying increasing precisions until
+    the error estimation is below `max(rtol * abs(s), atol)`, being `s`
+    the computed integral. Precision is also increased if the result or
+    the error estimation are not finite or if all digits of the result
+    are considered corrupted by roundoff (see `double_exponential()`).
+
+  The first pass is done in float64 arithmetic, with the numpy backend
+    of `double_exponential()`, if `f_numpy` is given (it must be the
+    same function as `f`, but working on ndarrays) or if `f` is an
+    expression accepted by `compile_expression()`, which is compiled for
+    both backends; a callable `f` without `f_numpy` has no such pass.
+    The following passes use `f` with mpmath at 15 decimal digits, and
+    then doubling the digits on each pass, up to `dps_max` (which
+    defaults to 4 times the pre-existing `mp.dps`, but at least 60).
+
+  If neither `rtol` nor `atol` are given, each pass works as
+    `double_exponential()` does by default, and its result is also
+    accepted when its level loop converged before the maximum level at
+    a precision not lower than the pre-existing `mp.dps` (which is not
+    modified), as its error estimation is then much larger than its
+    error; otherwise `rtol` defaults to 10 ** (1 - mp.dps). Given
+    `rtol` and `atol` are also given to each pass, so that it stops as
+    soon as they are met.
+  Returns the same tuple as `double_exponential()`, for the last pass
+    done, with an additional element: the number of decimal digits
+    used in such pass, 0 for the float64 one. The reported number of
+    function evaluations is that of all the passes.
+  """
+
+  if isinstance(f, str):
+    if f_numpy is None and np is not None:
+      f_numpy = compile_expression(f, 'numpy')
+    f = compile_expression(f)
+  natural = rtol is None and not atol
+  tol = {} if natural else {'rtol': rtol, 'atol': atol}
+  if rtol is None:
+    rtol = mp.mpf(10) ** (1 - mp.mp.dps)
+  target = mp.mp.dps
+  if dps_max is None:
+    dps_max = 4 * max(mp.mp.dps, 15)
+
+  # the precision ladder
+  rungs = [0] if f_numpy is not None else []
+  dps = 15
+  while True:
+    rungs.append(min(dps, dps_max))
+    if dps >= dps_max:
+      break
+    dps *= 2
+
+  tnfe = 0
+  for rung in rungs:
+    with mp.workdps(rung or 15):
+      if rung:
+        result = double_exponential(f, a, b, **tol)
+      else:
+        result = double_exponential(f_numpy, a, b, backend = 'numpy', **tol)
+      s, err = result[:2]
+      tnfe += result[2]
+      if not (mp.isfinite(s) and mp.isfinite(err)):
+        continue
+      if err <= max(rtol * abs(s), atol):
+        break
+      # converged by default before the maximum level, and not a bad
+      # result (all digits corrupted by roundoff)
+      if (natural and mp.mp.dps >= target and not (s == 0 and err) and
+          result[3] < _limits(*_classify(a, b)[:4], mp.mp.prec)[2]):
+        break
+  return result[:2] + (tnfe,) + result[3:] + (rung,)
+
+
+def _singularity(f, a, b, n = 16):
+  """
+  Looks for a jump of `f` or of its derivative inside the finite
+    interval from `a` to `b`, sampling it at `n - 1` interior points and
+    then narrowing, by bisection, the bracket where the jump seems to be.
+    For analytic functions, the size of the jump vanishes as the bracket
+    narrows, so it is only accepted if it does not.
+  Returns a tuple with the location of the jump (None if not found) and
+    the number of function evaluations performed.
+  """
+
+  nfe = 0
+  def value(x):
+    nonlocal nfe
+    nfe += 1
+    try:
+      v = f(x)
+    except ArithmeticError:
+      return None
+    return v if mp.isfinite(v) else None
+
+  xs = [a + (b - a) * k / n for k in range(1, n)]
+  fs = [value(x) for x in xs]
+  if None in fs:
+    return (None, nfe)
+
+  # jump of f: the size of the jump is the difference between the ends
+  # of the bracket
+  i = max(range(n - 2), key = lambda i: abs(fs[i + 1] - fs[i]))
+  l, r, fl, fr = xs[i], xs[i + 1], fs[i], fs[i + 1]
+  d0 = abs(fr - fl)
+  for step in range(mp.mp.prec):
+    m = (l + r) / 2
+    if not l < m < r:
+      return (m, nfe)
+    fm = value(m)
+    if fm is None:
+      return (m, nfe)
+    if abs(fm - fl) >= abs(fr - fm):
+      r, fr = m, fm
+    else:
+      l, fl = m, fm
+    if step == 16 and not abs(fr - fl) > d0 / 8:
+      break
+
+  # jump of the derivative: the size of the jump is the difference
+  # between the slopes at both halves of the bracket
+  def kink(l, m, r, fl, fm, fr):
+    return abs((fr - fm) / (r - m) - (fm - fl) / (m - l))
+  i = max(range(1, n - 2), key = lambda i: kink(xs[i - 1], xs[i], xs[i + 1], fs[i - 1], fs[i], fs[i + 1]))
+  l, m, r, fl, fm, fr = xs[i - 1], xs[i], xs[i + 1], fs[i - 1], fs[i], fs[i + 1]
+  k0 = kink(l, m, r, fl, fm, fr)
+  for step in range(mp.mp.prec):
+    ql, qr = (l + m) / 2, (m + r) / 2
+    if not l < ql < m < qr < r:
+      return (m, nfe)
+    fql, fqr = value(ql), value(qr)
+    if fql is None or fqr is None:
+      return (m, nfe)
+    l, m, r, fl, fm, fr = max(
+      ((l, ql, m, fl, fql, fm), (ql, m, qr, fql, fm, fqr), (m, qr, r, fm, fqr, fr)),
+      key = lambda t: kink(*t))
+    if step == 16 and not kink(l, m, r, fl, fm, fr) > k0 / 8:
+      break
+  return (None, nfe)
 
-  As many other quadrature methods the double exponential algorithm does
-    not manage well highly oscillatory integrands. Here, highly
-    oscillatory means that the integrand changes sign many (or infinite)
-    times along the integration interval.
+
+def double_exponential_adaptive(f, a, b, rtol = None, atol = 0, max_evals = 100000):
   """
+  Computes the integral of function `f` from `a` to `b` (which can be
+    `+mp.inf`/`-mp.inf`) splitting the interval into pieces, each of
+    them integrated with `double_exponential()`, until the sum of their
+    error estimations is below `max(rtol * abs(s), atol)`, being `s` the
+    computed integral, or until `max_evals` function evaluations have
+    been done. `rtol` defaults to 10 * sqrt(10 ** -mp.dps), the
+    convergence threshold of `double_exponential()`.
 
-  tanhsinh = False            # True if tanh-sinh case
-  expsinh = False             # True if exp-sinh case
-  bpa2z = False               # True if limits in {(+/-inf, 0), (0, +/-inf), (+/-inf, -/+inf)}
-  chg = False                 # True if limits = (+/-inf, b)
+  Pieces are kept in a priority queue ordered by their error estimation,
+    and the worst one is split each time. Finite pieces are split where
+    a jump of `f` or of its derivative is found inside them (see
+    `_singularity()`), or at their centre if no such jump is found;
+    infinite pieces are split at a point that gets farther away each
+    time. This way, integrands with discontinuities of them or of their
+    derivatives inside the integration interval are managed without the
+    need to know where such discontinuities are.
+
+  Returns a tuple with:
+    * the computed integral;
+    * an error estimation (the sum of those of all pieces);
+    * the number of function evaluations needed for the computation;
+    * a list with a tuple for each piece, sorted, holding its ends, its
+      integral and its error estimation.
+  """
+
+  if rtol is None:
+    rtol = 10 * mp.sqrt(mp.power(10, -mp.mp.dps))
 
   if mp.isnan(a) or mp.isnan(b):
-    return (mp.nan, mp.nan, 0, 0, 0, [])
+    return (mp.nan, mp.nan, 0, [])
 
   if a == b:
-    return (0, 0, 0, 0, 0, [])
+    return (0, 0, 0, [])
 
-  if mp.isfinite(a) and mp.isfinite(b):
-    # tanh-sinh case
-    bpa2 = (b + a) / 2        # centre point
-    bma2 = (b - a) / 2        # half interval
-    tanhsinh = True
-  elif mp.isfinite(a) or mp.isfinite(b):
-    # exp-sinh case
-    chg = mp.isfinite(b)
-    bpa2, bma2 = (b, a) if chg else (a, b)
-    bma2 = mp.sign(bma2)
-    bpa2z = mp.almosteq(bpa2, 0.0)
-    expsinh = True
+  tnfe = 0
+  heap = []                   # pieces that may be split, worst first
+  done = []                   # pieces that cannot be split
+  def push(a, b):
+    nonlocal tnfe
+    s, err, nfe = double_exponential(f, a, b)[:3]
+    tnfe += nfe
+    if mp.isfinite(a) and mp.isfinite(b) and abs(b - a) <= 4 * mp.eps * max(abs(a), abs(b)):
+      done.append((a, b, s, err))
+    else:
+      heapq.heappush(heap, (-err, len(heap) + len(done), a, b, s))
+
+  push(a, b)
+  while heap:
+    s = mp.fsum([piece[4] for piece in heap] + [piece[2] for piece in done])
+    err = mp.fsum([-piece[0] for piece in heap] + [piece[3] for piece in done])
+    if err <= max(rtol * abs(s), atol) or tnfe >= max_evals:
+      break
+    ea, n, a, b, s = heapq.heappop(heap)
+    if mp.isfinite(a) and mp.isfinite(b):
+      c, nfe = _singularity(f, a, b)
+      tnfe += nfe
+      if c is None or not a < c < b and not b < c < a:
+        c = (a + b) / 2
+    elif mp.isfinite(a):
+      c = a + mp.sign(b) * max(1, abs(a))
+    elif mp.isfinite(b):
+      c = b + mp.sign(a) * max(1, abs(b))
+    else:
+      c = 0
+    push(a, c)
+    push(c, b)
+
+  pieces = sorted([(a, b, s, -ea) for ea, n, a, b, s in heap] + done,
+                  key = lambda piece: min(piece[0], piece[1]))
+  return (mp.fsum(piece[2] for piece in pieces), mp.fsum(piece[3] for piece in pieces), tnfe, pieces)
+
+
+def _shared_nodes(tables, variant, prec, level, exptmax):
+  """
+  Returns the same nodes as `_nodes()`, but taken from those in `tables`
+    (a dict, updated in place), built once for each variant, precision
+    and level, with an `exptmax` at least twice as large as any asked
+    for so far. As `exptmax` depends on the integration limits, this
+    way integrals with many different limits share their nodes, instead
+    of building (and evicting from the LRU cache) a table for each one.
+  """
+
+  key = (variant, prec, level)
+  if key not in tables or tables[key][0] < exptmax:
+    # exptmax may be small or even negative (for tiny intervals or far
+    # from the origin), so the margin is not only a factor
+    larger = max(2 * exptmax, exptmax + 1)
+    tables[key] = (larger, _nodes(variant, prec, level, larger))
+  # number of nodes whose t is such that exp(t) <= exptmax (but the
+  # 1st one, always present); t = h, 2h, 3h... at level 0 and t = h,
+  # 3h, 5h... at the next ones
+  h = 2.0 ** -level
+  if exptmax < mp.exp(h):
+    n = 1
   else:
-    # sinh-sinh case
-    bpa2 = 0
-    bma2 = mp.sign(b)
-    bpa2z = True
+    n = float(mp.log(exptmax)) / h
+    n = max(1, min(len(tables[key][1][0]), int(n if not level else (n + 1) / 2)))
+  if (key, n) not in tables:
+    tables[key, n] = tuple(c[:n] for c in tables[key][1])
+  return tables[key, n]
+
+
+def _apply(f, xs, x):
+  """
+  Returns `f(*xs, x)`, as a picklable integrand of the innermost axis of
+    `double_exponential_nd()`.
+  """
+
+  return f(*xs, x)
+
+
+def double_exponential_nd(f, bounds, executor = None, rtol = None):
+  """
+  Computes the multiple integral of function `f(x0, x1, ...)`, with
+    `bounds` a list with the `(a, b)` limits of `x0`, `x1`... (the
+    outermost variable first), nesting the double exponential method
+    along each axis, with the variant (tanh-sinh, exp-sinh or sinh-sinh)
+    that suits its limits. The limits of an axis can be numbers
+    (including `+mp.inf`/`-mp.inf`) or functions of the variables of the
+    outer axes, e.g.: the area of the unit circle is
+    `double_exponential_nd(lambda x, y: 1, [(-1, 1), (lambda x:
+    -mp.sqrt(1 - x**2), lambda x: mp.sqrt(1 - x**2))])`.
+
+  It is much faster than nesting calls to `double_exponential()` when
+    inner limits are not constant: the abscissas and weights of each
+    axis are built once and shared by all the integrals along it (see
+    `_shared_nodes()`), instead of once per outer abscissa.
+
+  If an `executor` is given, the abscissas of each level of the
+    innermost integrals are sent to it together (see
+    `double_exponential()`), so, for process pools, `f` must be
+    picklable. `rtol`, if given, is the relative tolerance of the
+    integral along each axis.
+
+  Returns the same tuple as `double_exponential()` for the outermost
+    integral, but for the number of function evaluations, which is the
+    number of calls to `f`.
+  """
+
+  tables = [{} for _ in bounds]   # node tables of each axis
+  tnfe = 0
+
+  def integrate(k, xs):
+    nonlocal tnfe
+    a, b = (l(*xs) if callable(l) else l for l in bounds[k])
+    result = _trivial(a, b)
+    if result is not None:
+      return result
+    innermost = k == len(bounds) - 1
+    if innermost:
+      g = partial(_apply, f, xs)
+    else:
+      g = lambda x: integrate(k + 1, xs + (x,))[0]
+    state = IntegrationState(g, *_classify(a, b), rtol)
+    result = _result(state, _levels(state, executor if innermost else None, tables = tables[k]))
+    if innermost:
+      tnfe += result[2]
+    return result
+
+  if not bounds:
+    raise ValueError('at least one axis is needed')
+  result = integrate(0, ())
+  return result[:2] + (tnfe,) + result[3:]
+
+
+def _values(f, x, ps):
+  """
+  Returns a list with the values of `f(x, ps)`, or zeros if `f` raises
+    an ArithmeticError.
+  """
 
+  try:
+    return list(f(x, ps))
+  except ArithmeticError:
+    return [0] * len(ps)
+
+
+def _sweep(f, params, variant, bpa2, bma2, bpa2z, chg):
+  """
+  The engine of `double_exponential_sweep()` for vectorized integrands
+    and the mpmath backend, for integrals already classified by
+    `_classify()`. Each parameter leaves the abscissa walk and the level
+    loop as soon as its own integral allows it.
+  """
+
+  eps, thr, levelmax, exptmax = _limits(variant, bpa2, bma2, bpa2z, mp.mp.prec)
   pi2 = mp.pi() / 2
-  pi4 = mp.pi() / 4
-
-  # convergence threshold
-  eps = mp.power(10, -mp.mp.dps)
-  thr = 10 * mp.sqrt(eps)
-  if bpa2z:
-    eps = mp.power(10, -(mp.mp.dps / 2) ** 2)
-  # maximum allowed level
-  levelmax = int(round(mp.log(mp.mp.dps, 2)) + 1)   # + 2) also acceptable
-
-  # maximum t
-  if tanhsinh:
-    tmax = 2 * min(1, abs(bma2))
-  elif bpa2z:
-    tmax = mp.sqrt(eps)
-  else:
-    tmax = abs(1 / bpa2 / 2)
-  tmax = mp.ln(tmax / eps)
-  if not tanhsinh:
-    tmax *= 2
-##  tmax = mp.ln(tmax / pi2)
-  exptmax = tmax / pi2
 
-  s = 0                       # s is the computed integral
+  k = len(params)
+  f0 = _values(f, bpa2 + bma2 if variant == 1 else bpa2, params)
+  s = [0] * k                 # s is the computed integral, for each parameter
+  sp = [0] * k                # s at previous level
+  tnfe = [1] * k              # Total Number of Function Evaluations
+  lvl = [0] * k               # level reached
+  q_lvl = [[] for j in range(k)]  # computed value of integral at each level
+  walked = [[] for j in range(k)]  # number of nodes walked at each level (right, left)
+  active = list(range(k))     # parameters not converged yet
   h = 2                       # rectangle width
-  tnfe = 0                    # Total Number of Function Evaluations
-  q_lvl = []                  # computed value of integral at each level
   # progress thru levels
   for level in range(levelmax + 1):
-    # sp = s at previous level
-    sp = s * bma2 * pi2 * h
-    if chg:
-      sp = -sp
-    if level:
-      q_lvl.append(sp)
-    wsl = 0                   # weigthed sum at this level
+    for j in active:
+      sp[j] = s[j] * bma2 * pi2 * h
+      if chg:
+        sp[j] = -sp[j]
+      if level:
+        q_lvl[j].append(sp[j])
     h /= 2
-    expt = mp.exp(h)          # exp(t)
-    exph = expt ** 2 if level else expt
-    # walk abscissas
-    while True:
-      # try to avoid the computation of too many exp functions...
-      iexpt = 1 / expt
-      cht = (expt + iexpt) / 2
-      # pi / 2 * sinh(t)
-      pi2sh = pi4 * (expt - iexpt)
-      # weight and abscissa
-      w = r = mp.exp(pi2sh)
-      if not expsinh:
-        iexppi2sh = 1 / r
-        w += iexppi2sh        # 2cosh(pi2sh)
-        r -= iexppi2sh        # 2sinh(pi2sh)
-        r /= w if tanhsinh else 2
-        w /= 2                # cosh(pi2sh)
-      if tanhsinh:
-        w = 1 / w ** 2
-      try:
-        fpl = f(bpa2 + bma2 * r)
-      except ArithmeticError:
-        fpl = 0
-      p = fpl * w if mp.isnormal(fpl) else 0
-      try:
-        fmi = f(bpa2 + bma2 / r) if expsinh else f(bpa2 - bma2 * r)
-      except ArithmeticError:
-        fmi = 0
-      tnfe += 2
-      p += (fmi / w if expsinh else fmi * w) if mp.isnormal(fmi) else 0
-      p *= cht
-      wsl += p
-      # next exp(t)
-      expt *= exph
-      # done with level?
-      if expt > exptmax:
-        break
-      # early test (mainly for the sinh-sinh case)
-      if abs(p) <= abs(eps * wsl):
+    wsl = {j: 0 for j in active}  # weigthed sum at this level
+    nodes = _nodes(variant, mp.mp.prec, level, exptmax)
+    ends = {j: list(_ends(walked[j], level, nodes)) for j in active}
+    # walk abscissas, each side as `_walk()` does
+    for i, (xpl, xmi, wpl, wmi) in enumerate(zip(*nodes)):
+      right = [j for j in active if i < ends[j][0]]
+      left = [j for j in active if i < ends[j][1]]
+      if not right and not left:
         break
+      fpl = dict(zip(right, _values(f, bpa2 + bma2 * xpl, [params[j] for j in right]) if right else ()))
+      fmi = dict(zip(left, _values(f, bpa2 + bma2 * xmi, [params[j] for j in left]) if left else ()))
+      for j in active:
+        u = fpl.get(j, 0)
+        v = fmi.get(j, 0)
+        p = u * wpl if mp.isnormal(u) else 0
+        q = v * wmi if mp.isnormal(v) else 0
+        wsl[j] += p + q
+        tnfe[j] += (j in fpl) + (j in fmi)
+        # early tests (mainly for the sinh-sinh case), for both sides
+        # together and for each one on its own
+        if j in fpl and j in fmi and abs(p + q) <= abs(eps * wsl[j]):
+          ends[j] = [i + 1, i + 1]
+        if j in fpl and abs(p) <= abs(eps * wsl[j]):
+          ends[j][0] = i + 1
+        if j in fmi and abs(q) <= abs(eps * wsl[j]):
+          ends[j][1] = i + 1
+    for j in active:
+      walked[j].append(tuple(ends[j]))
     # end of abscissa loop
 
-    s += wsl
+    still = []
+    for j in active:
+      s[j] += wsl[j]
+      # add the 1st series term
+      if not level:
+        s[j] += f0[j]
+      lvl[j] = level
+      # converged?
+      if s[j] and not (abs(2 * abs(wsl[j]) - abs(s[j])) < abs(thr * s[j])):
+        still.append(j)
+    active = still
+    if not active:
+      break
+  # end of level loop
+
+  results = []
+  for j in range(k):
+    # iteration done, apply constant coefficients
+    s[j] *= bma2 * pi2 * 2.0 ** -lvl[j]
+    if chg:
+      s[j] = -s[j]
+    q_lvl[j].append(s[j])
+
+    # check for bad results
+    (sj,), (err,) = _checked([s[j]], [sp[j]])
+    results.append((sj, err, tnfe[j], lvl[j], variant, q_lvl[j]))
+  return results
+
+
+def _sweep_numpy(f, params, variant, bpa2, bma2, bpa2z, chg):
+  """
+  Same as `_sweep()`, for the numpy backend.
+  """
+
+  eps, thr, levelmax, exptmax, bpa2, bma2 = _limits_numpy(variant, bpa2, bma2, bpa2z)
+  pi2 = np.pi / 2
+
+  params = np.asarray(params)
+  k = len(params)
+  f0 = _feval_numpy(f, np.array([bpa2 + bma2 if variant == 1 else bpa2]), params)[0]
+  s = np.zeros(k, dtype = f0.dtype)   # s is the computed integral
+  sp = np.zeros(k, dtype = f0.dtype)  # s at previous level
+  tnfe = np.ones(k, dtype = int)      # Total Number of Function Evaluations
+  lvl = np.zeros(k, dtype = int)      # level reached
+  q_lvl = [[] for j in range(k)]      # computed value of integral at each level
+  active = np.arange(k)               # parameters not converged yet
+  h = 2                               # rectangle width
+  # progress thru levels
+  for level in range(levelmax + 1):
+    sp[active] = s[active] * bma2 * pi2 * h
+    if chg:
+      sp[active] = -sp[active]
+    if level:
+      for j in active:
+        q_lvl[j].append(sp[j].item())
+    h /= 2
+    # evaluate all abscissas at once
+    xpl, xmi, wpl, wmi = _nodes_numpy(variant, level, exptmax)
+    n = len(xpl)
+    fx = _feval_numpy(f, bpa2 + bma2 * np.concatenate((xpl, xmi)), params[active])
+    tnfe[active] += 2 * n
+    p = fx[:n] * wpl[:, None] + fx[n:] * wmi[:, None]
+    # truncate as the sequential abscissa walk does for both sides
+    # together
+    wsl = np.cumsum(p, axis = 0)
+    stop = np.abs(p) <= np.abs(eps * wsl)
+    wsl = wsl[np.where(stop.any(axis = 0), stop.argmax(axis = 0), n - 1), np.arange(len(active))]
+
+    s[active] += wsl
     # add the 1st series term
     if not level:
-      try:
-        s += f(bpa2 + bma2) if expsinh else f(bpa2)
-      except ArithmeticError:
-        pass
-      tnfe += 1
+      s[active] += f0[active]
+    lvl[active] = level
 
     # converged?
-    if not s or (abs(2 * abs(wsl) - abs(s)) < abs(thr * s)):
+    sa = s[active]
+    active = active[(sa != 0) & ~(np.abs(2 * np.abs(wsl) - np.abs(sa)) < np.abs(thr * sa))]
+    if not len(active):
       break
   # end of level loop
 
   # iteration done, apply constant coefficients
-  s *= bma2 * pi2 * h
+  s *= bma2 * pi2 * 2.0 ** -lvl
   if chg:
     s = -s
-  q_lvl.append(s)
 
-  # check for bad results
-  err = abs(sp - s)
-  if 10 * err >= abs(s):
-    err = abs(err) + abs(s)
-    s = 0
+  results = []
+  for j in range(k):
+    sj = s[j].item()
+    q_lvl[j].append(sj)
+    # check for bad results
+    (sj,), (err,) = _checked([sj], [sp[j].item()], zero = 0.0)
+    results.append((sj, err, tnfe[j].item(), lvl[j].item(), variant, q_lvl[j]))
+  return results
 
-  variant = 0 if tanhsinh else 1 if expsinh else 2
 
-  return (s, err, tnfe, level, variant, q_lvl)
+def double_exponential_sweep(f, a, b, params, vectorized = False, backend = 'mpmath'):
+  """
+  Computes the integrals of `f(x, p)` for `x` from `a` to `b` and for
+    each value `p` in `params`, using the double exponential method.
+  Returns a list with a tuple, as those returned by
+    `double_exponential()`, for each parameter.
+
+  All integrals share the abscissas and weights, computed only once. If
+    `vectorized` is true, `f` is called as `f(x, ps)`, with `ps` a list
+    of parameters, and must return a sequence with the value for each of
+    them, so the work common to all parameters is shared too. Each
+    parameter is only evaluated until its own integral converges, so
+    easy integrals end earlier than hard ones, and the results are the
+    same as computing each integral on its own with the same backend.
+    Beware that, in this case, an ArithmeticError raised by `f` zeroes
+    its value for all the parameters at that abscissa.
+
+  With `backend = 'numpy'`, see `double_exponential()`; if `vectorized`
+    is true, `f` is called with an ndarray `x` with shape (n, 1) and an
+    ndarray `ps` with shape (1, k) and must return an ndarray with shape
+    (n, k), as broadcasting `x` against `ps` does.
+  """
+
+  if backend not in ('mpmath', 'numpy'):
+    raise ValueError("unknown backend '%s'" % backend)
+
+  params = list(params)
+  if not vectorized:
+    return [double_exponential(lambda x, p = p: f(x, p), a, b, backend = backend)
+            for p in params]
+
+  result = _trivial(a, b)
+  if result is not None or not params:
+    return [result for p in params]
+
+  if backend == 'numpy':
+    return _sweep_numpy(f, params, *_classify(a, b))
+  return _sweep(f, params, *_classify(a, b))
+
+
+# node tables shared by the integrals solved by a process of
+# integrate_many() (see _shared_nodes())
+_process_tables = {}
+
+
+def _integrate_shared(f, a, b, backend, tables):
+  """
+  Calls `double_exponential(f, a, b, backend = backend)` but, with the
+    mpmath backend, taking the nodes from `tables` (see
+    `_shared_nodes()`).
+  """
+
+  if backend != 'mpmath' or mp.isnan(a) or mp.isnan(b) or a == b:
+    return double_exponential(f, a, b, backend = backend)
+  state = IntegrationState(f, *_classify(a, b))
+  return _result(state, _levels(state, tables = tables))
+
+
+def _integrate_one(f, a, b, prec, backend):
+  """
+  Calls `double_exponential()` working with `prec` bits, with `a`, `b`
+    and the returned tuple in the form given by `_freeze()`, sharing the
+    nodes with the previous calls in this process.
+  """
+
+  with mp.workprec(prec):
+    return _freeze(_integrate_shared(f, _thaw(a), _thaw(b), backend, _process_tables))
+
+
+def integrate_many(problems, mode = 'sequential', workers = None, backend = 'mpmath'):
+  """
+  Computes many integrals calling `double_exponential()`.
+
+  Each item in `problems` can be a tuple `(f, a, b)` or `(f, a, b, dps)`,
+    or a dict with keys 'f', 'a', 'b' and, optionally, 'dps' (so the
+    items of `test_integrals.test_integral` can be used directly). When
+    no 'dps' is given, the pre-existing `mp.dps` precision is used.
+  Returns a list with the tuples returned by `double_exponential()`, in
+    the same order as in `problems`.
+
+  Problems are classified as `double_exponential()` does and grouped by
+    variant and precision and, with the mpmath backend, the nodes of each
+    level are built once for each group (see `_shared_nodes()`), instead
+    of once for each integration limits. With `mode = 'sequential'` problems are solved one
+    after the other; with `mode = 'thread'` each group is solved with a
+    pool of `workers` threads (only useful when `f` releases the GIL, as
+    the numpy backend usually does; as mpmath keeps its working precision
+    in a global context, which many of its functions change temporarily,
+    this mode is only reliable with `backend = 'numpy'` or when `f` does
+    not call mpmath functions); with `mode = 'process'` all groups
+    are solved with a pool of `workers` processes, which needs `f`, `a`
+    and `b` to be picklable (i.e. not lambdas). `backend` is passed to
+    `double_exponential()`.
+  """
+
+  if mode not in ('sequential', 'thread', 'process'):
+    raise ValueError("unknown mode '%s'" % mode)
+
+  # normalize problems and group them by precision and variant
+  jobs = []
+  groups = {}
+  for n, problem in enumerate(problems):
+    if isinstance(problem, dict):
+      f, a, b, dps = problem['f'], problem['a'], problem['b'], problem.get('dps')
+    else:
+      f, a, b, *dps = problem
+      dps = dps[0] if dps else None
+    prec = mp.mp.prec if dps is None else mp.libmp.dps_to_prec(dps)
+    with mp.workprec(prec):
+      variant = _classify(a, b)[0] if not (mp.isnan(a) or mp.isnan(b) or a == b) else -1
+    jobs.append((f, a, b, prec))
+    groups.setdefault((prec, variant), []).append(n)
+
+  results = [None] * len(jobs)
+  if not jobs:
+    return results
+  order = [n for key in sorted(groups) for n in groups[key]]
+  tables = {}
+  if mode == 'process':
+    with ProcessPoolExecutor(workers) as executor:
+      chunksize = max(1, len(order) // (4 * (workers or os.cpu_count() or 1)))
+      for n, result in zip(order, executor.map(_integrate_one,
+          *zip(*(_freeze(jobs[n]) for n in order)), [backend] * len(order),
+          chunksize = chunksize)):
+        with mp.workprec(jobs[n][3]):
+          results[n] = _thaw(result)
+  elif mode == 'thread':
+    with ThreadPoolExecutor(workers) as executor:
+      # mp.prec is global, so only one precision can be in use at a time
+      for (prec, variant), group in sorted(groups.items()):
+        with mp.workprec(prec):
+          for n, result in zip(group, executor.map(
+              lambda n: _integrate_shared(*jobs[n][:3], backend, tables), group)):
+            results[n] = result
+  else:
+    for n in order:
+      f, a, b, prec = jobs[n]
+      with mp.workprec(prec):
+        results[n] = _integrate_shared(f, a, b, backend, tables)
+  return results
+
+
+# names accepted in expressions, with the mpmath, math and numpy objects
+# they stand for (None if missing)
+_EXPRESSION_NAMES = {
+  'pi': ('pi', 'pi', 'pi'),
+  'e': ('e', 'e', 'e'),
+  'inf': ('inf', 'inf', 'inf'),
+  'j': ('j', None, None),
+  'euler': ('euler', None, None),
+  'mpf': ('mpf', None, None),
+  'mpc': ('mpc', None, None),
+  'sqrt': ('sqrt', 'sqrt', 'sqrt'),
+  'cbrt': ('cbrt', None, 'cbrt'),
+  'exp': ('exp', 'exp', 'exp'),
+  'expm1': ('expm1', 'expm1', 'expm1'),
+  'log': ('log', 'log', 'log'),
+  'log10': ('log10', 'log10', 'log10'),
+  'log1p': ('log1p', 'log1p', 'log1p'),
+  'sin': ('sin', 'sin', 'sin'),
+  'cos': ('cos', 'cos', 'cos'),
+  'tan': ('tan', 'tan', 'tan'),
+  'sec': ('sec', None, None),
+  'csc': ('csc', None, None),
+  'cot': ('cot', None, None),
+  'asin': ('asin', 'asin', 'arcsin'),
+  'acos': ('acos', 'acos', 'arccos'),
+  'atan': ('atan', 'atan', 'arctan'),
+  'atan2': ('atan2', 'atan2', 'arctan2'),
+  'sinh': ('sinh', 'sinh', 'sinh'),
+  'cosh': ('cosh', 'cosh', 'cosh'),
+  'tanh': ('tanh', 'tanh', 'tanh'),
+  'sech': ('sech', None, None),
+  'csch': ('csch', None, None),
+  'coth': ('coth', None, None),
+  'asinh': ('asinh', 'asinh', 'arcsinh'),
+  'acosh': ('acosh', 'acosh', 'arccosh'),
+  'atanh': ('atanh', 'atanh', 'arctanh'),
+  'hypot': ('hypot', 'hypot', 'hypot'),
+  'fabs': ('fabs', 'fabs', 'fabs'),
+  'floor': ('floor', 'floor', 'floor'),
+  'ceil': ('ceil', 'ceil', 'ceil'),
+  'sign': ('sign', None, 'sign'),
+  'gamma': ('gamma', 'gamma', None),
+  'loggamma': ('loggamma', 'lgamma', None),
+  'erf': ('erf', 'erf', None),
+  'erfc': ('erfc', 'erfc', None),
+  'zeta': ('zeta', None, None),
+  'polylog': ('polylog', None, None),
+  'ei': ('ei', None, None),
+  'e1': ('e1', None, None),
+  'besselj': ('besselj', None, None),
+  'bessely': ('bessely', None, None),
+  'besseli': ('besseli', None, None),
+  'besselk': ('besselk', None, None),
+  'airyai': ('airyai', None, None),
+  'airybi': ('airybi', None, None)}
+
+# other spellings of those names
+_EXPRESSION_ALIASES = {
+  'arcsin': 'asin', 'arccos': 'acos', 'arctan': 'atan', 'arctan2': 'atan2',
+  'arcsinh': 'asinh', 'arccosh': 'acosh', 'arctanh': 'atanh', 'lgamma': 'loggamma'}
+
+# modules that can prefix those names
+_EXPRESSION_MODULES = ('mp', 'mpmath', 'math', 'np', 'numpy')
+
+# syntax accepted in expressions
+_EXPRESSION_NODES = (
+  ast.Expression, ast.Load, ast.Constant, ast.Name, ast.Attribute, ast.Call,
+  ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+  ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+  ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+  ast.BoolOp, ast.And, ast.Or, ast.IfExp, ast.Tuple)
+
+
+class _Namer(ast.NodeTransformer):
+  """
+  Checks that an expression only uses the syntax in `_EXPRESSION_NODES`,
+    the names in `_EXPRESSION_NAMES` (or their aliases, optionally
+    prefixed by a module in `_EXPRESSION_MODULES`) and the variables
+    `variables`, replacing the prefixed names by the plain ones. The
+    names used are collected in `names`.
+  """
+
+  def __init__(self, variables):
+    self.variables = variables
+    self.names = set()
+
+  def generic_visit(self, node):
+    if not isinstance(node, _EXPRESSION_NODES):
+      raise ValueError("'%s' is not allowed in expressions" % type(node).__name__)
+    return super().generic_visit(node)
+
+  def visit_Constant(self, node):
+    if not isinstance(node.value, (int, float, complex, str)):
+      raise ValueError("constant %r is not allowed in expressions" % (node.value,))
+    return node
+
+  def visit_Name(self, node):
+    if node.id not in self.variables:
+      self.names.add(self.name(node.id))
+      node.id = self.name(node.id)
+    return node
+
+  def visit_Attribute(self, node):
+    if not isinstance(node.value, ast.Name) or node.value.id not in _EXPRESSION_MODULES:
+      raise ValueError("attributes are only allowed in expressions for modules %s" %
+                       ', '.join(_EXPRESSION_MODULES))
+    name = self.name(node.attr)
+    self.names.add(name)
+    return ast.copy_location(ast.Name(id = name, ctx = ast.Load()), node)
+
+  def visit_Call(self, node):
+    if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+      raise ValueError('only positional arguments are allowed in expressions')
+    if not isinstance(node.func, (ast.Name, ast.Attribute)):
+      raise ValueError('only named functions can be called in expressions')
+    return self.generic_visit(node)
+
+  @staticmethod
+  def name(name):
+    name = _EXPRESSION_ALIASES.get(name, name)
+    if name not in _EXPRESSION_NAMES and name != 'abs':
+      raise ValueError("name '%s' is not allowed in expressions" % name)
+    return name
+
+
+def compile_expression(text, backend = 'mpmath'):
+  """
+  Compiles the expression `text`, a function of `x` (e.g.: '2/(1 +
+    x**2)') or a lambda of a single argument (e.g.: 'lambda t: 2/(1 +
+    t**2)'), into a function of a single argument, as the integrand of
+    `double_exponential()`.
+
+  Expressions are not evaluated by Python as they are, but their syntax
+    tree is checked to only hold numbers, arithmetic, comparisons,
+    conditional expressions, tuples, the variable and the elementary
+    and special functions and constants in `_EXPRESSION_NAMES` (e.g.:
+    'exp', 'besselj', 'pi'), optionally prefixed by 'mp.', 'mpmath.',
+    'math.', 'np.' or 'numpy.', raising ValueError otherwise. So no
+    arbitrary code can be run.
+
+  With `backend = 'mpmath'` such names are those of mpmath; with 'math'
+    those of module math, for a faster function of Python floats; and
+    with 'numpy' those of numpy, for a function of ndarrays, as needed
+    by the numpy backend of `double_exponential()` (where numpy lacks a
+    function, that of module math is applied element by element). A
+    ValueError is raised if a name is not available for `backend`.
+
+  Compiled expressions are cached by `text` and `backend`.
+  """
+
+  return _compile(text, backend, 'x')
+
+
+def _constant(text):
+  """
+  Returns the value, at the current precision, of the expression `text`
+    (e.g.: '-mp.inf' or 'pi/2'), that has no variable, as accepted by
+    `compile_expression()` with the mpmath backend.
+  """
+
+  return _compile(text, 'mpmath', None)()
+
+
+@lru_cache(maxsize = 256)
+def _compile(text, backend, variable):
+  """
+  Compiles the expression `text` for `backend`, as described in
+    `compile_expression()`, into a function of `variable` (which a
+    lambda overrides), or into a function without arguments if
+    `variable` is None.
+  """
+
+  if backend not in ('mpmath', 'math', 'numpy'):
+    raise ValueError("unknown backend '%s'" % backend)
+  column = ('mpmath', 'math', 'numpy').index(backend)
+  if backend == 'numpy' and np is None:
+    raise ImportError('the numpy backend needs numpy to be installed')
+  try:
+    tree = ast.parse(text.strip(), mode = 'eval')
+  except SyntaxError as e:
+    raise ValueError('bad expression %r: %s' % (text, e.msg)) from None
+  variables = (variable,) if variable else ()
+  if variables and isinstance(tree.body, ast.Lambda):
+    args = tree.body.args
+    if args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg or args.defaults or \
+       len(args.args) != 1:
+      raise ValueError('lambdas in expressions must have a single argument')
+    variables = (args.args[0].arg,)
+    tree.body = tree.body.body
+  namer = _Namer(variables)
+  tree = namer.visit(tree)
+
+  namespace = {'__builtins__': {}, 'abs': abs}
+  for name in namer.names - {'abs'}:
+    names = _EXPRESSION_NAMES[name]
+    if names[column] is not None:
+      namespace[name] = getattr((mp, math, np)[column], names[column])
+    elif backend == 'numpy' and names[1] is not None:
+      namespace[name] = np.vectorize(getattr(math, names[1]), otypes = [float])
+    else:
+      raise ValueError("'%s' is not available for the %s backend" % (name, backend))
+  if backend == 'numpy' and any(isinstance(node, (ast.IfExp, ast.BoolOp))
+                                for node in ast.walk(tree)):
+    raise ValueError('conditional expressions are not available for the numpy backend')
+
+  arguments = ast.arguments(posonlyargs = [], args = [ast.arg(arg = v) for v in variables],
+                            kwonlyargs = [], kw_defaults = [], defaults = [])
+  tree = ast.Expression(ast.Lambda(args = arguments, body = tree.body))
+  code = compile(ast.fix_missing_locations(tree), '<expression>', 'eval')
+  return eval(code, namespace)
+
+
+def _jsonable(v):
+  """
+  Returns `v` (a number, or a tuple, list or mpmath matrix of them) as a
+    value that can be encoded as JSON, with mpf and mpc numbers as
+    strings (with all their digits).
+  """
+
+  if isinstance(v, mp.matrix):
+    return [[_jsonable(v[i, j]) for j in range(v.cols)] for i in range(v.rows)]
+  if isinstance(v, (tuple, list)):
+    return [_jsonable(u) for u in v]
+  if isinstance(v, (mp.mpf, mp.mpc)):
+    return str(v)
+  return v
+
+
+def _solve_request(request, prec, backend = 'mpmath'):
+  """
+  Computes the integral described by `request`, a dict with items 'f',
+    'a' and 'b' (expressions as the command line arguments, see
+    `compile_expression()`, 'a' and 'b' can also be numbers) and,
+    optionally, 'dps' or 'prec' (else, `prec` bits are used), 'backend'
+    (else, `backend` is used), 'weight' and 'omega' (an expression or a
+    number), as in `double_exponential()`, and 'id' (copied to the
+    answer).
+  Returns a dict with items 's', 'err', 'tnfe', 'level' and 'variant',
+    as returned by `double_exponential()` (numbers with all their digits
+    as strings), or 'error' with a message if the computation fails.
+  """
+
+  answer = {'id': request['id']} if 'id' in request else {}
+  try:
+    for k in ('f', 'a', 'b'):
+      if k not in request:
+        raise ValueError("missing '%s'" % k)
+    if 'dps' in request:
+      context = mp.workdps(int(request['dps']))
+    else:
+      context = mp.workprec(int(request.get('prec', prec)))
+    with context:
+      backend = request.get('backend', backend)
+      f = compile_expression(request['f'], backend)
+      a, b, omega = (_constant(request[k]) if isinstance(request.get(k), str) else request.get(k)
+                     for k in ('a', 'b', 'omega'))
+      s, err, tnfe, level, variant, q_lvl = double_exponential(f, a, b, backend = backend,
+                                                               weight = request.get('weight'),
+                                                               omega = omega)
+      answer.update(s = _jsonable(s), err = _jsonable(err), tnfe = tnfe, level = level,
+                    variant = ('tanh-sinh', 'exp-sinh', 'sinh-sinh', 'Ooura-Mori')[variant])
+  except Exception as e:
+    answer['error'] = '%s: %s' % (type(e).__name__, e)
+  return answer
+
+
+def _batch(file, out, prec, backend = 'mpmath'):
+  """
+  Computes the integrals described by the JSON lines read from `file`
+    (see `_solve_request()`), writing to `out` a JSON line with the
+    result of each one as soon as it is done. Nodes are shared by all
+    the integrals, as they are cached.
+  """
+
+  for line in file:
+    if not line.strip():
+      continue
+    try:
+      request = json.loads(line)
+      if not isinstance(request, dict):
+        raise ValueError('a JSON object is expected')
+    except ValueError as e:
+      answer = {'error': '%s: %s' % (type(e).__name__, e)}
+    else:
+      answer = _solve_request(request, prec, backend)
+    out.write(json.dumps(answer) + '\n')
+    out.flush()
+
+
+def _pack(message):
+  """
+  Returns `message` (a JSON-encodable object or an already encoded
+    str) as sent to/from the server: its UTF-8 JSON prefixed by its
+    length.
+  """
+
+  body = (message if isinstance(message, str) else json.dumps(message)).encode()
+  return _MESSAGE_HEADER.pack(len(body)) + body
+
+
+def _serve_request(request, prec, backend):
+  """
+  Computes `request` in a worker process of the server, as
+    `_solve_request()` does, adding to the answer the seconds spent
+    computing it ('time').
+  """
+
+  start = time.perf_counter()
+  answer = _solve_request(request, prec, backend)
+  answer['time'] = time.perf_counter() - start
+  return answer
+
+
+async def _serve(path, prec, backend = 'mpmath', workers = None):
+  """
+  Serves the integration requests received thru the Unix socket `path`
+    until cancelled. Each message, both requests and answers, is a JSON
+    object (see `_solve_request()`) prefixed by its length in bytes (4
+    bytes, big-endian). The requests are computed, in the order they
+    arrive, by a pool of `workers` processes, which keep the nodes they
+    compute cached for later requests, and answered as soon as they are
+    done (so, to match them, give each request an 'id'). Answers also
+    have the seconds spent computing ('time') and since the request was
+    received ('latency'). A connection is closed after answering all
+    its requests once the client has shut down its writing side.
+  """
+
+  loop = asyncio.get_running_loop()
+
+  async def solve(request, writer, received):
+    if isinstance(request, dict):
+      answer = await loop.run_in_executor(pool, _serve_request, request, prec, backend)
+    else:
+      answer = {'error': 'ValueError: a JSON object is expected'}
+    answer['latency'] = time.perf_counter() - received
+    writer.write(_pack(answer))
+
+  async def handle(reader, writer):
+    tasks = []
+    try:
+      while True:
+        try:
+          length, = _MESSAGE_HEADER.unpack(await reader.readexactly(_MESSAGE_HEADER.size))
+          body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+          break
+        received = time.perf_counter()
+        try:
+          request = json.loads(body)
+        except ValueError as e:
+          writer.write(_pack({'error': '%s: %s' % (type(e).__name__, e)}))
+          continue
+        tasks.append(asyncio.ensure_future(solve(request, writer, received)))
+      await asyncio.gather(*tasks)
+      await writer.drain()
+    finally:
+      for task in tasks:
+        task.cancel()
+      writer.close()
+
+  # workers are not forked, so they do not inherit the sockets of the
+  # connections open when they are started
+  with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context('forkserver')) as pool:
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    server = await asyncio.start_unix_server(handle, path)
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+
+def _client(path, requests, out):
+  """
+  Sends the integration `requests` (JSON objects, encoded or not) to the
+    server listening at the Unix socket `path` (see `_serve()`), writing
+    to `out` a JSON line with each answer as soon as it is received.
+  """
+
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    sock.connect(path)
+    for request in requests:
+      sock.sendall(_pack(request))
+    sock.shutdown(socket.SHUT_WR)
+    file = sock.makefile('rb')
+    while True:
+      header = file.read(_MESSAGE_HEADER.size)
+      if len(header) < _MESSAGE_HEADER.size:
+        break
+      length, = _MESSAGE_HEADER.unpack(header)
+      out.write(file.read(length).decode() + '\n')
+      out.flush()
 
 
 if __name__ == '__main__':
   import argparse
+  import sys
   from sys import exit
 
   parser = argparse.ArgumentParser(
     description = 'Numerically evaluates a definite integral using the double-exponential method (aka the tanh-sinh quadrature).',
-    epilog = 'Returns the computed integral, the estimated error of the quadrature, the Total Number of Function Evaluations (TNFE) needed during the calculation and the used variant of the method. When specifying the arguments, it can be assumed that package mpmath is imported as mp. Use "--" after that last option and before any argument that starts with "-".')
-  parser.add_argument('f',
-    help = 'function to be integrated, may be a " quoted string with a lambda expression, e.g.: "lambda x: 2/(1 + x**2)"')
-  parser.add_argument('a',
+    epilog = 'Returns the computed integral, the estimated error of the quadrature, the Total Number of Function Evaluations (TNFE) needed during the calculation and the used variant of the method. The arguments are expressions with numbers, arithmetic and the usual elementary and special functions and constants (e.g. "exp", "besselj" or "pi"), optionally prefixed by "mp.". Use "--" after that last option and before any argument that starts with "-".')
+  parser.add_argument('f', nargs = '?',
+    help = 'function to be integrated, a " quoted expression of x or a lambda expression, e.g.: "2/(1 + x**2)" or "lambda x: 2/(1 + x**2)"')
+  parser.add_argument('a', nargs = '?',
     help = 'left extreme of the integration interval (accepts infinities as "±mp.inf")')
-  parser.add_argument('b',
+  parser.add_argument('b', nargs = '?',
     help = 'right extreme of the integration interval (accepts infinities as "±mp.inf")')
   parser.add_argument('-b', '--bits',
     help = 'number of bits used during calculations (sets mpmath.prec)')
   parser.add_argument('-d', '--digits',
     help = 'number of decimal digits used during calculations (sets mpmath.dps)')
+  parser.add_argument('--backend', choices = ('mpmath', 'numpy'),
+    help = 'backend used for the calculations (default mpmath; numpy uses float64 arithmetic, so it needs no more than 15 digits)')
+  parser.add_argument('--weight', choices = ('sin', 'cos'),
+    help = 'integrate f times sin(omega*x) or cos(omega*x) with the Ooura-Mori transform (for intervals with an infinite end)')
+  parser.add_argument('--omega',
+    help = 'angular frequency of the --weight')
+  parser.add_argument('--batch', nargs = '?', const = '-', metavar = 'FILE',
+    help = 'instead of f, a and b, read integrals from FILE (or from the standard input) as JSON lines like {"f": ..., "a": ..., "b": ..., "dps": ...}, writing a JSON line with each result')
+  parser.add_argument('--serve', metavar = 'SOCKET',
+    help = 'instead of f, a and b, serve integrals (requested as with --batch, but with length-prefixed JSON messages) thru the Unix socket SOCKET')
+  parser.add_argument('--workers', type = int,
+    help = 'number of worker processes used by --serve (default: number of CPUs)')
+  parser.add_argument('--client', metavar = 'SOCKET',
+    help = 'send f, a and b (or the JSON lines of --batch) to the server at the Unix socket SOCKET, writing a JSON line with each result')
   args = parser.parse_args()
 
+  if args.serve is not None:
+    if args.f is not None or args.batch is not None or args.client is not None:
+      parser.error('--serve cannot be used with f, a, b, --batch or --client')
+  elif (args.batch is None) == (args.b is None):
+    parser.error('either f, a and b, --batch or --serve must be given')
+
   if args.bits != None and args.digits != None:
     parser.print_usage()
     print('%s: error: cannot specify both -b and -d options simulaneously' % parser.prog)
     exit()
 
+  if args.client is not None:
+    if args.batch is None:
+      request = {'f': args.f, 'a': args.a, 'b': args.b}
+      if args.bits != None:
+        request['prec'] = int(args.bits)
+      if args.digits != None:
+        request['dps'] = int(args.digits)
+      if args.backend != None:
+        request['backend'] = args.backend
+      if args.weight != None:
+        request['weight'] = args.weight
+      if args.omega != None:
+        request['omega'] = args.omega
+      _client(args.client, [request], sys.stdout)
+    elif args.batch == '-':
+      _client(args.client, (line for line in sys.stdin if line.strip()), sys.stdout)
+    else:
+      with open(args.batch) as file:
+        _client(args.client, (line for line in file if line.strip()), sys.stdout)
+    exit()
+
   if args.bits != None:
     mp.mp.prec = args.bits
 
   if args.digits != None:
     mp.mp.dps = args.digits
 
-  s, err, tnfe, level, variant, q_lvl = double_exponential(
-    f = eval(args.f),
-    a = eval(args.a),
-    b = eval(args.b))
+  if args.serve is not None:
+    try:
+      asyncio.run(_serve(args.serve, mp.mp.prec, args.backend or 'mpmath', args.workers))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+      pass
+    exit()
+
+  if args.batch is not None:
+    if args.batch == '-':
+      _batch(sys.stdin, sys.stdout, mp.mp.prec, args.backend or 'mpmath')
+    else:
+      with open(args.batch) as file:
+        _batch(file, sys.stdout, mp.mp.prec, args.backend or 'mpmath')
+    exit()
+
+  try:
+    f = compile_expression(args.f, args.backend or 'mpmath')
+    a = _constant(args.a)
+    b = _constant(args.b)
+    omega = _constant(args.omega) if args.omega != None else None
+  except ValueError as e:
+    parser.error(e)
+
+  try:
+    s, err, tnfe, level, variant, q_lvl = double_exponential(
+      f = f,
+      a = a,
+      b = b,
+      backend = args.backend or 'mpmath',
+      weight = args.weight,
+      omega = omega)
+  except ValueError as e:
+    parser.error(e)
 
   print('I = %s ± %s\n' % (s, err))
-  print('TNFE = %i (%s)\n' % (tnfe, ('tanh-sinh', 'exp-sinh', 'sinh-sinh')[variant]))
+  print('TNFE = %i (%s)\n' % (tnfe, ('tanh-sinh', 'exp-sinh', 'sinh-sinh', 'Ooura-Mori')[variant]))
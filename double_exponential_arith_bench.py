@@ -0,0 +1,125 @@
+﻿# Copyright (c) 2021, emece67 - MIT License
+
+
+"""
+Measures the time needed to build the abscissas and weights used by
+  double_exponential() with each available arithmetic (see
+  set_arithmetic()), for the test cases in test_integrals.py at several
+  precisions. For each precision reports:
+    * dps:    decimal digits
+    * tables: number of node tables (levels of each variant and
+                truncation) needed by the test cases
+  and, for each arithmetic, the seconds spent building those tables and
+  the speedup over mpmath.
+
+Usage:
+
+  double_exponential_arith_bench.py [-h] [-d DPS] [-a ARITHMETIC] [-i]
+
+with options:
+    * -d DPS:         decimal digits to try (can be repeated; default
+                        50, 100, 500 and 1000; e.g. "-d 5000 -d 10000",
+                        which takes long with mpmath)
+    * -a ARITHMETIC:  arithmetic to try: mpmath, gmpy2 or flint (can be
+                        repeated; default all the installed ones)
+    * -i:             also report the seconds spent integrating all the
+                        test cases (including the building of nodes)
+"""
+
+
+import argparse
+import importlib
+from time import perf_counter
+
+from mpmath import mp
+
+import double_exponential as de
+
+
+def node_tables():
+  """
+  Returns the set of arguments of _make_nodes() for all the node tables
+    needed by the test cases, at the current precision.
+  """
+
+  import test_integrals
+  test_integrals = importlib.reload(test_integrals)   # values depend on mp.dps
+  tables = set()
+  for case in test_integrals.test_integral:
+    if mp.isnan(case['a']) or mp.isnan(case['b']) or case['a'] == case['b']:
+      continue
+    variant, bpa2, bma2, bpa2z, chg = de._classify(case['a'], case['b'])
+    eps, thr, levelmax, exptmax = de._limits(variant, bpa2, bma2, bpa2z, mp.prec)
+    tables.update((variant, mp.prec, level, exptmax) for level in range(levelmax + 1))
+  return tables, test_integrals.test_integral
+
+
+def build(tables):
+  """
+  Returns the seconds spent building `tables`.
+  """
+
+  start = perf_counter()
+  for args in tables:
+    de._make_nodes(*args)
+  return perf_counter() - start
+
+
+def integrate(cases):
+  """
+  Returns the seconds spent integrating `cases`, with no node cached.
+  """
+
+  de._nodes.cache_clear()
+  start = perf_counter()
+  for case in cases:
+    de.double_exponential(case['f'], case['a'], case['b'])
+  return perf_counter() - start
+
+
+def row(dps, tables, times):
+  """
+  Returns the report line for `times`, a dict with the seconds spent by
+    each arithmetic.
+  """
+
+  line = '%6s %6s' % (dps, tables)
+  for arithmetic, seconds in times.items():
+    speedup = times['mpmath'] / seconds if 'mpmath' in times else float('nan')
+    line += ' %9.3fs (x%5.2f)' % (seconds, speedup)
+  return line
+
+
+def main():
+  installed = ['mpmath'] + [name for name, module in (('gmpy2', de.gmpy2), ('flint', de.flint)) if module]
+  parser = argparse.ArgumentParser(
+    description = 'Measures the time needed to build the nodes of the test cases in test_integrals.py with each arithmetic.')
+  parser.add_argument('-d', '--dps', type = int, action = 'append',
+    help = 'decimal digits to try (can be repeated; default 50, 100, 500 and 1000)')
+  parser.add_argument('-a', '--arithmetic', action = 'append', choices = ('mpmath', 'gmpy2', 'flint'),
+    help = 'arithmetic to try (can be repeated; default all the installed ones)')
+  parser.add_argument('-i', '--integrate', action = 'store_true',
+    help = 'also report the seconds spent integrating all the test cases')
+  args = parser.parse_args()
+
+  arithmetics = args.arithmetic or installed
+  de.set_node_cache(None)
+  print('%6s %6s' % ('dps', 'tables') + ''.join(' %18s' % a for a in arithmetics))
+  for dps in args.dps or (50, 100, 500, 1000):
+    mp.dps = dps
+    tables, cases = node_tables()
+    times = {}
+    for arithmetic in arithmetics:
+      de.set_arithmetic(arithmetic)
+      times[arithmetic] = build(tables)
+    print(row(dps, len(tables), times), flush = True)
+    if args.integrate:
+      for arithmetic in arithmetics:
+        de.set_arithmetic(arithmetic)
+        times[arithmetic] = integrate(cases)
+      print(row('', 'all', times), flush = True)
+  de.set_arithmetic('auto')
+
+
+if __name__ == '__main__':
+  main()
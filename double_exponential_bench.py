@@ -0,0 +1,219 @@
+﻿# Copyright (c) 2021, emece67 - MIT License
+
+
+"""
+Benchmarks double_exponential() over the list `test_integral` of
+  test-cases at several precisions. For each precision and case reports:
+    * dps:    decimal digits
+    * #:      case number
+    * TNFE:   Total Number of Function Evaluations
+    * Lvl:    level reached during iteration
+    * CD:     correct digits achieved
+    * median: median of the wall times of the repeats (seconds)
+    * IQR:    interquartile range of such wall times (seconds)
+  and, for each precision, the accumulated TNFE, CD and median times.
+
+Each case is computed some times before being timed (warmup), so the
+  abscissas and weights it needs are already computed, and the timings
+  reflect the engine and the integrand only.
+
+Results can be saved as JSON and compared with those saved before (the
+  baseline). A case regresses when its TNFE increases, its CD
+  decreases or its median time exceeds that of the baseline by more than
+  the tolerance plus both IQRs. When comparing, the exit status is 1 if
+  any case regresses.
+
+Usage:
+
+  double_exponential_bench.py [-h] [-d DPS] [-w WARMUP] [-n REPEATS]
+                              [-v {ss,es,ts}] [-r FIRST:LAST] [-m REGEX]
+                              [-o FILE] [-c BASELINE] [-T TOLERANCE]
+
+with options:
+    * -d DPS:         decimal digits to try (can be repeated; default
+                        15, 50, 100 and 500)
+    * -w WARMUP:      untimed computations of each case (default 1)
+    * -n REPEATS:     timed computations of each case (default 5)
+    * -v VARIANT:     only try cases of this variant (can be repeated)
+    * -r FIRST:LAST:  only try cases in this Python-like slice of
+                        case numbers
+    * -m REGEX:       only try cases whose 'fs' matches this regular
+                        expression
+    * -o FILE:        save the results in this JSON file
+    * -c BASELINE:    compare the results with those in this JSON file
+    * -T TOLERANCE:   relative time increase allowed before reporting
+                        a regression (default 0.1)
+"""
+
+
+import argparse
+import importlib
+import json
+import statistics
+import sys
+from time import perf_counter
+
+import mpmath
+from mpmath import mp
+
+import double_exponential_tests as tests
+import test_integrals
+from double_exponential import double_exponential
+
+
+# version of the format of the JSON results
+RESULTS_VERSION = 1
+
+
+def time_case(integral, warmup, repeats):
+  """
+  Computes `integral` (an item of `test_integral`) `warmup` + `repeats`
+    times, returns what double_exponential() returns, except the list of
+    approximations at each level, and the wall times of the repeats.
+  """
+
+  for _ in range(warmup):
+    double_exponential(integral['f'], integral['a'], integral['b'])
+  times = []
+  for _ in range(repeats):
+    start = perf_counter()
+    result = double_exponential(integral['f'], integral['a'], integral['b'])
+    times.append(perf_counter() - start)
+  return result[:5], times
+
+
+def spread(times):
+  """
+  Returns the median and the interquartile range of `times`.
+  """
+
+  if len(times) < 2:
+    return times[0], 0.0
+  q1, q2, q3 = statistics.quantiles(times, n = 4)
+  return statistics.median(times), q3 - q1
+
+
+def run(dps, cases, warmup, repeats):
+  """
+  Benchmarks the test cases in `cases` (numbers, see
+    `tests.select_cases()`) at `dps` decimal digits, printing the results
+    of each one. Returns a list with a dict with the results of each
+    case.
+  """
+
+  mp.dps = dps
+  integrals = importlib.reload(test_integrals).test_integral   # values depend on mp.dps
+  results = []
+  for n in cases:
+    integral = integrals[n]
+    (q, err_r, tnfe, lvl, variant), times = time_case(integral, warmup, repeats)
+    median, iqr = spread(times)
+    cd = tests.correct_digits(q, integral['s'])
+    print('%5i %03i %04i %02i  %02i %10.6f %10.6f' % (dps, n, tnfe, lvl, cd, median, iqr), flush = True)
+    results.append({
+      'case': n,
+      'fs': integral['fs'],
+      'variant': tests.VARIANTS[variant],
+      'tnfe': int(tnfe),
+      'level': int(lvl),
+      'cd': int(cd),
+      'median': median,
+      'iqr': iqr,
+      'times': times})
+  print('%5i all %04i     %03i %10.6f' % (dps, sum(r['tnfe'] for r in results),
+                                         sum(r['cd'] for r in results),
+                                         sum(r['median'] for r in results)))
+  return results
+
+
+def compare(results, baseline, tolerance):
+  """
+  Compares `results` with `baseline` (both dicts of lists of results, by
+    precision, as returned by `run()`), printing the totals of the cases
+    in both and the cases that regress. Returns the number of such cases.
+  """
+
+  regressions = 0
+  print('  dps #   base_TNFE TNFE base_CD CD  base_time       time')
+  for dps, cases in results.items():
+    base = {r['case']: r for r in baseline.get(dps, [])}
+    common = [(base[r['case']], r) for r in cases if r['case'] in base]
+    for b, r in common:
+      slower = r['median'] > b['median'] * (1 + tolerance) + b['iqr'] + r['iqr']
+      if slower or r['tnfe'] > b['tnfe'] or r['cd'] < b['cd']:
+        regressions += 1
+        print('%5s %03i %04i      %04i %02i      %02i %10.6f %10.6f' % (
+          dps, r['case'], b['tnfe'], r['tnfe'], b['cd'], r['cd'], b['median'], r['median']))
+    if common:
+      base_time = sum(b['median'] for b, r in common)
+      time = sum(r['median'] for b, r in common)
+      print('%5s all %04i      %04i %03i     %03i %10.6f %10.6f (x%.2f)' % (
+        dps, sum(b['tnfe'] for b, r in common), sum(r['tnfe'] for b, r in common),
+        sum(b['cd'] for b, r in common), sum(r['cd'] for b, r in common),
+        base_time, time, time / base_time if base_time else float('nan')))
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description = 'Benchmarks double_exponential() over the test cases in test_integrals.py.')
+  parser.add_argument('-d', '--dps', type = int, action = 'append',
+    help = 'decimal digits to try (can be repeated; default 15, 50, 100 and 500)')
+  parser.add_argument('-w', '--warmup', type = int, default = 1,
+    help = 'untimed computations of each case (default 1)')
+  parser.add_argument('-n', '--repeats', type = int, default = 5,
+    help = 'timed computations of each case (default 5)')
+  parser.add_argument('-v', '--variant', action = 'append', choices = ('ss', 'es', 'ts'),
+    metavar = 'VARIANT',
+    help = 'only try cases of this variant: ss, es or ts (can be repeated)')
+  parser.add_argument('-r', '--range', default = ':', metavar = 'FIRST:LAST',
+    help = 'only try cases in this slice of case numbers, e.g.: "100:120"')
+  parser.add_argument('-m', '--match', metavar = 'REGEX',
+    help = "only try cases whose 'fs' matches this regular expression")
+  parser.add_argument('-o', '--output', metavar = 'FILE',
+    help = 'save the results in this JSON file')
+  parser.add_argument('-c', '--compare', metavar = 'BASELINE',
+    help = 'compare the results with those in this JSON file')
+  parser.add_argument('-T', '--tolerance', type = float, default = 0.1,
+    help = 'relative time increase allowed before reporting a regression (default 0.1)')
+  args = parser.parse_args()
+  if args.repeats < 1:
+    parser.error('at least 1 repeat is needed')
+
+  try:
+    cases = slice(*(int(i) if i else None for i in args.range.split(':')))
+  except (TypeError, ValueError):
+    parser.error('bad range "%s"' % args.range)
+  variants = [v.upper() for v in args.variant] if args.variant else None
+  cases = tests.select_cases(variants, cases, args.match)
+
+  print('  dps #   TNFE Lvl CD     median        IQR')
+  results = {}
+  for dps in args.dps or (15, 50, 100, 500):
+    results[str(dps)] = run(dps, cases, args.warmup, args.repeats)
+
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump({
+        'version': RESULTS_VERSION,
+        'python': sys.version.split()[0],
+        'mpmath': mpmath.__version__,
+        'mpmath_backend': mpmath.libmp.BACKEND,
+        'warmup': args.warmup,
+        'repeats': args.repeats,
+        'results': results}, file, indent = 1)
+
+  if args.compare:
+    with open(args.compare) as file:
+      baseline = json.load(file)
+    if baseline.get('version') != RESULTS_VERSION:
+      sys.exit('%s: unknown results version' % args.compare)
+    print()
+    regressions = compare(results, baseline['results'], args.tolerance)
+    print('%i regression(s)' % regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
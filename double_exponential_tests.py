@@ -21,49 +21,313 @@ At end reports accumulated results:
 
 Set mp.dps to the desired number of decimal digits to be used in
   calculations.
+
+Usage:
+
+  double_exponential_tests.py [-h] [-j JOBS] [-t TIMEOUT] [-s] [-c]
+                              [-v {ss,es,ts}] [-r FIRST:LAST] [-m REGEX]
+
+with options:
+    * -j JOBS:        number of worker processes used to compute the
+                        test cases (default 1); output is always
+                        printed in case order
+    * -t TIMEOUT:     maximum number of seconds allowed for each case;
+                        cases exceeding it are reported as "timeout"
+                        and accounted with 0 CD
+    * -s:             compute the cases with `symmetry = 'auto'`, adding
+                        those in `symmetry_integral` (numbered after
+                        the ones in `test_integral`), whose parity is
+                        easily mistaken
+    * -c:             instead, run the regression checks in `checks`,
+                        reporting "ok" or "FAIL" for each one
+    * -v VARIANT:     only try cases of this variant (can be repeated)
+    * -r FIRST:LAST:  only try cases in this Python-like slice of
+                        case numbers (e.g.: "-r 100:120" or, for
+                        negative numbers, "-r=-2:")
+    * -m REGEX:       only try cases whose 'fs' matches this regular
+                        expression
+
+When JOBS > 1 or a TIMEOUT is given, the test cases are computed in
+  subprocesses.
 """
 
 
-from mpmath import mp, isfinite, floor, log10
+import argparse
+import re
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from time import monotonic
+
+from mpmath import mp, isfinite, floor, log10, mpf, inf, pi, sqrt, exp, erf, sin, cos
 
 
 # number of decimal digits used in computations
 mp.dps = 15
 
 
-from double_exponential import double_exponential
+import double_exponential as de
+from double_exponential import double_exponential, double_exponential_nd, integrate_many, \
+  ARITHMETICS, set_arithmetic, _classify
 from test_integrals import test_integral
 
 
-# #:      Number
-# TNFE:   Total Number of Function Evaluations
-# Lvl:    level reached during iteration
-# CD:     Correct Digits
-# err_r:  reported error
-# err_t:  true error
-# q:      computed integral
-# I:      true integral
-print('#   TNFE Lvl CD err_r err_t %s I'%('q'.ljust(mp.dps + 6)))
-
-# accumulated results
-res = {
-  'SS_TNFE' : 0,    # accumulated TNFE for all sinh-sinh cases
-  'SS_CD': 0,       # accumulated CD for all sinh-sinh cases
-  'SS_n': 0,        # number of sinh-sinh cases
-  'ES_TNFE': 0,     # same for exp-sinh
-  'ES_CD': 0,
-  'ES_n': 0,
-  'TS_TNFE': 0,     # and for tanh-sinh
-  'TS_CD': 0,
-  'TS_n': 0}
-
-# try (some/all) test cases
-for n, integral in enumerate(test_integral[:]):
-  q, err_r, tnfe, lvl, variant, q_lvl = double_exponential(integral['f'], \
-                                          integral['a'], integral['b'])
-  I = integral['s']
-
-  # number of correct digits (CD)
+# variant names, as used in the accumulated results
+VARIANTS = ('TS', 'ES', 'SS')
+
+
+# cases (as those in test_integrals.py) with integrands close to, but not,
+# even or odd, and some that are
+symmetry_integral = [
+  {
+    'a': mpf('-1'),
+    'b': mpf('1'),
+    's': mpf('2e-13'),
+    'f': lambda x: x**3 + mpf('1e-13'),
+    'fs': "x**3 + 1e-13"
+  },
+  {
+    'a': mpf('-1'),
+    'b': mpf('1'),
+    's': mpf('2e-12')*sin(1),
+    'f': lambda x: sin(x) + mpf('1e-12')*cos(x),
+    'fs': "sin(x) + 1e-12*cos(x)"
+  },
+  {
+    'a': mpf('-1'),
+    'b': mpf('1'),
+    's': sqrt(pi)/2*exp(mpf('1e-24')/4)*(erf(1 - mpf('1e-12')/2) + erf(1 + mpf('1e-12')/2)),
+    'f': lambda x: exp(mpf('1e-12')*x - x**2),
+    'fs': "exp(1e-12*x - x**2)"
+  },
+  {
+    'a': mpf('1'),
+    'b': mpf('3'),
+    's': mpf('2')/3,
+    'f': lambda x: (x - 2)**2,
+    'fs': "(x - 2)**2"
+  },
+  {
+    'a': mpf('1'),
+    'b': mpf('3'),
+    's': mpf('0'),
+    'f': lambda x: (x - 2)**3,
+    'fs': "(x - 2)**3"
+  },
+  {
+    'a': -inf,
+    'b': +inf,
+    's': pi/sqrt(2),
+    'f': lambda x: 1/(1 + x**4),
+    'fs': "1/(1 + x**4)"
+  },
+  {
+    'a': -inf,
+    'b': +inf,
+    's': mpf('0'),
+    'f': lambda x: x/(1 + x**4),
+    'fs': "x/(1 + x**4)"
+  },
+  {
+    'a': -inf,
+    'b': +inf,
+    's': pi,
+    'f': lambda x: 1/(1 + x**2) + x*exp(-x**4),
+    'fs': "1/(1 + x**2) + x*exp(-x**4)"
+  }
+]
+
+
+def same_nodes(f, a, b):
+  """
+  Returns True if all the installed arithmetics (see set_arithmetic())
+    need the same function evaluations and levels for the integral of
+    `f` from `a` to `b`.
+  """
+
+  saved = de._arithmetic
+  results = []
+  try:
+    for arithmetic in ARITHMETICS[1:]:
+      try:
+        set_arithmetic(arithmetic)
+      except ImportError:
+        continue
+      results.append(double_exponential(f, a, b)[2:4])
+  finally:
+    set_arithmetic(saved)
+  return all(result == results[0] for result in results)
+
+
+# regression checks of other functions, with a description and a
+# function returning True if passed
+checks = [
+  {
+    'fs': "same nodes with all arithmetics at a tiny interval",
+    'check': lambda: same_nodes(lambda x: x, 0, mpf('1e-20'))
+  },
+  {
+    'fs': "same nodes with all arithmetics at a far end",
+    'check': lambda: same_nodes(lambda x: 1/x**2, mpf('1e20'), inf)
+  },
+  {
+    'fs': "integrate_many() at a tiny interval and at a far end",
+    'check': lambda: [r[:5] for r in integrate_many([(lambda x: x, 0, mpf('1e-20')),
+                                                     (lambda x: 1/x**2, mpf('1e20'), inf)])] ==
+                     [double_exponential(lambda x: x, 0, mpf('1e-20'))[:5],
+                      double_exponential(lambda x: 1/x**2, mpf('1e20'), inf)[:5]]
+  },
+  {
+    'fs': "double_exponential_nd() with a tiny inner interval",
+    'check': lambda: double_exponential_nd(lambda x, y: 1, [(0, 1), (0, mpf('1e-20'))])[0] ==
+                     double_exponential(lambda x: double_exponential(lambda y: 1, 0, mpf('1e-20'))[0],
+                                        0, 1)[0]
+  }
+]
+
+
+def run_checks():
+  """
+  Runs the regression checks in `checks`, reporting the result of each
+    one.
+  """
+
+  for n, check in enumerate(checks):
+    try:
+      passed = check['check']()
+    except Exception as e:
+      passed = False
+      print('%03i %s: %s' % (n, type(e).__name__, e))
+    print('%03i %-4s %s' % (n, 'ok' if passed else 'FAIL', check['fs']))
+
+
+def integrals(symmetry = None):
+  """
+  Returns the list of test cases to try, with `symmetry` (as in
+    double_exponential()) or without it.
+  """
+
+  return test_integral + symmetry_integral if symmetry else test_integral
+
+
+def run_case(n, symmetry = None):
+  """
+  Computes test case `n` with `symmetry`, returns what
+    double_exponential() returns, except the list of approximations at
+    each level.
+  """
+
+  integral = integrals(symmetry)[n]
+  return double_exponential(integral['f'], integral['a'], integral['b'], symmetry = symmetry)[:5]
+
+
+def worker(conn, symmetry):
+  """
+  Computes, with `symmetry`, the test cases whose numbers are received
+    thru `conn`, sending back the results, until None is received.
+  """
+
+  while True:
+    n = conn.recv()
+    if n is None:
+      break
+    try:
+      result = run_case(n, symmetry)
+    except Exception as e:
+      result = e
+    conn.send((n, result))
+
+
+def spawn(symmetry):
+  """
+  Starts a worker process computing the cases with `symmetry`, returns
+    the parent end of its pipe and the process.
+  """
+
+  conn, child_conn = Pipe()
+  process = Process(target = worker, args = (child_conn, symmetry), daemon = True)
+  process.start()
+  child_conn.close()
+  return conn, process
+
+
+def run_parallel(cases, jobs, timeout, symmetry = None):
+  """
+  Computes the test cases in `cases` with `jobs` worker processes (and
+    `symmetry`), yielding tuples (n, result) in the same order as
+    `cases`. `result` is None for the cases lasting more than `timeout` seconds, whose
+    worker is killed and replaced.
+  """
+
+  processes = {}              # worker processes, by pipe
+  busy = {}                   # (case, deadline), by pipe of busy workers
+  idle = []                   # pipes of idle workers
+  for _ in range(min(jobs, len(cases))):
+    conn, processes[conn] = spawn(symmetry)
+    idle.append(conn)
+  pending = list(reversed(cases))
+  results = {}
+  try:
+    for n in cases:
+      while n not in results:
+        # feed idle workers
+        while idle and pending:
+          conn = idle.pop()
+          m = pending.pop()
+          conn.send(m)
+          busy[conn] = (m, monotonic() + timeout if timeout else None)
+        # wait for results or for the nearest deadline
+        deadlines = [d for m, d in busy.values() if d is not None]
+        for conn in wait(list(busy),
+                         max(0, min(deadlines) - monotonic()) if deadlines else None):
+          m, result = conn.recv()
+          if isinstance(result, Exception):
+            raise result
+          results[m] = result
+          del busy[conn]
+          idle.append(conn)
+        # kill workers beyond their deadline
+        now = monotonic()
+        for conn, (m, deadline) in list(busy.items()):
+          if deadline is not None and deadline <= now:
+            processes.pop(conn).kill()
+            conn.close()
+            del busy[conn]
+            results[m] = None
+            conn, processes[conn] = spawn(symmetry)
+            idle.append(conn)
+      yield n, results.pop(n)
+  finally:
+    for conn, process in processes.items():
+      if conn in busy:
+        process.kill()
+      else:
+        conn.send(None)
+      process.join()
+
+
+def select_cases(variants, cases, regex, symmetry = None):
+  """
+  Returns the numbers of the test cases (to try with `symmetry`) with a
+    variant in `variants` (all if None), in the `cases` slice and with an
+    'fs' matching `regex` (all if None).
+  """
+
+  selected = []
+  for n in range(len(integrals(symmetry)))[cases]:
+    integral = integrals(symmetry)[n]
+    if variants and VARIANTS[_classify(integral['a'], integral['b'])[0]] not in variants:
+      continue
+    if regex and not re.search(regex, integral['fs']):
+      continue
+    selected.append(n)
+  return selected
+
+
+def correct_digits(q, I):
+  """
+  Returns the number of correct digits (CD) of `q` respect to `I`.
+  """
+
   if I != 0 and isfinite(I):
     cd =  max(\
               min(int(floor(log10(abs(I))) - floor(log10(abs(q - I)))), \
@@ -74,22 +338,14 @@ for n, integral in enumerate(test_integral[:]):
     cd = int(-round(log10(abs(q)))) if q != 0 else mp.dps
   else:
     cd = 0
+  return cd
 
-  # populate results
-  if variant == 0:
-    res['TS_TNFE'] += tnfe
-    res['TS_CD'] += cd
-    res['TS_n'] += 1
-  elif variant == 1:
-    res['ES_TNFE'] += tnfe
-    res['ES_CD'] += cd
-    res['ES_n'] += 1
-  else:
-    res['SS_TNFE'] += tnfe
-    res['SS_CD'] += cd
-    res['SS_n'] += 1
 
-  # print results for each integral
+def print_case(n, tnfe, lvl, cd, err_r, q, I):
+  """
+  Prints the results for a test case.
+  """
+
   if I != 0 and isfinite(I):
     print('%03i %04i %02i '%(n, tnfe, lvl), end = ' ')
     print('%02i'%(cd), end = ' ')
@@ -105,12 +361,93 @@ for n, integral in enumerate(test_integral[:]):
             '%+*.*e'%(mp.dps + 6, mp.dps - 1, q), 'inf', end = '')
   print()
 
-# print cumulative results
-res['SS_n'] += 1 if not res['SS_n'] else 0
-res['ES_n'] += 1 if not res['ES_n'] else 0
-res['TS_n'] += 1 if not res['TS_n'] else 0
-print()
-print('SS: %05i - %04i (%02i)\nES: %05i - %04i (%02i)\nTS: %05i - %04i (%02i)\n'
-  %(res['SS_TNFE'], res['SS_CD'], 100*res['SS_CD']/mp.dps/res['SS_n'],
-    res['ES_TNFE'], res['ES_CD'], 100*res['ES_CD']/mp.dps/res['ES_n'],
-    res['TS_TNFE'], res['TS_CD'], 100*res['TS_CD']/mp.dps/res['TS_n']))
+
+def main():
+  parser = argparse.ArgumentParser(
+    description = 'Computes the test cases in test_integrals.py and reports the achieved results.')
+  parser.add_argument('-j', '--jobs', type = int, default = 1,
+    help = 'number of worker processes (default 1)')
+  parser.add_argument('-t', '--timeout', type = float,
+    help = 'maximum number of seconds allowed for each case')
+  parser.add_argument('-s', '--symmetry', action = 'store_const', const = 'auto',
+    help = "compute the cases with symmetry = 'auto', adding some whose parity is easily mistaken")
+  parser.add_argument('-c', '--checks', action = 'store_true',
+    help = 'run the regression checks of other functions instead')
+  parser.add_argument('-v', '--variant', action = 'append', choices = ('ss', 'es', 'ts'),
+    metavar = 'VARIANT',
+    help = 'only try cases of this variant: ss, es or ts (can be repeated)')
+  parser.add_argument('-r', '--range', default = ':', metavar = 'FIRST:LAST',
+    help = 'only try cases in this slice of case numbers, e.g.: "100:120"')
+  parser.add_argument('-m', '--match', metavar = 'REGEX',
+    help = "only try cases whose 'fs' matches this regular expression")
+  args = parser.parse_args()
+
+  if args.checks:
+    run_checks()
+    return
+
+  try:
+    cases = slice(*(int(i) if i else None for i in args.range.split(':')))
+  except (TypeError, ValueError):
+    parser.error('bad range "%s"' % args.range)
+  variants = [v.upper() for v in args.variant] if args.variant else None
+  cases = select_cases(variants, cases, args.match, args.symmetry)
+
+  # #:      Number
+  # TNFE:   Total Number of Function Evaluations
+  # Lvl:    level reached during iteration
+  # CD:     Correct Digits
+  # err_r:  reported error
+  # err_t:  true error
+  # q:      computed integral
+  # I:      true integral
+  print('#   TNFE Lvl CD err_r err_t %s I'%('q'.ljust(mp.dps + 6)))
+
+  # accumulated results
+  res = {
+    'SS_TNFE' : 0,    # accumulated TNFE for all sinh-sinh cases
+    'SS_CD': 0,       # accumulated CD for all sinh-sinh cases
+    'SS_n': 0,        # number of sinh-sinh cases
+    'ES_TNFE': 0,     # same for exp-sinh
+    'ES_CD': 0,
+    'ES_n': 0,
+    'TS_TNFE': 0,     # and for tanh-sinh
+    'TS_CD': 0,
+    'TS_n': 0}
+
+  # try (some/all) test cases
+  if args.jobs > 1 or args.timeout:
+    results = run_parallel(cases, args.jobs, args.timeout, args.symmetry)
+  else:
+    results = ((n, run_case(n, args.symmetry)) for n in cases)
+  for n, result in results:
+    integral = integrals(args.symmetry)[n]
+    I = integral['s']
+    if result is None:
+      # timed out, no TNFE nor CD accounted
+      variant = _classify(integral['a'], integral['b'])[0]
+      q = tnfe = cd = 0
+      print('%03i timeout'%(n))
+    else:
+      q, err_r, tnfe, lvl, variant = result
+      cd = correct_digits(q, I)
+      print_case(n, tnfe, lvl, cd, err_r, q, I)
+
+    # populate results
+    res[VARIANTS[variant] + '_TNFE'] += tnfe
+    res[VARIANTS[variant] + '_CD'] += cd
+    res[VARIANTS[variant] + '_n'] += 1
+
+  # print cumulative results
+  res['SS_n'] += 1 if not res['SS_n'] else 0
+  res['ES_n'] += 1 if not res['ES_n'] else 0
+  res['TS_n'] += 1 if not res['TS_n'] else 0
+  print()
+  print('SS: %05i - %04i (%02i)\nES: %05i - %04i (%02i)\nTS: %05i - %04i (%02i)\n'
+    %(res['SS_TNFE'], res['SS_CD'], 100*res['SS_CD']/mp.dps/res['SS_n'],
+      res['ES_TNFE'], res['ES_CD'], 100*res['ES_CD']/mp.dps/res['ES_n'],
+      res['TS_TNFE'], res['TS_CD'], 100*res['TS_CD']/mp.dps/res['TS_n']))
+
+
+if __name__ == '__main__':
+  main()